@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'task', 'key', 'status', 'attempts', 'run_after')
+    list_filter = ('status', 'task')
+    search_fields = ('task', 'key')
+    readonly_fields = ('created', 'locked_by', 'locked_at', 'last_error')
+
+
+admin.site.register(Job, JobAdmin)
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .database import apply_pragmas
+
+        connection_created.connect(
+            apply_pragmas, dispatch_uid='core.apply_pragmas'
+        )
@@ -0,0 +1,259 @@
+"""Нагрузочный прогон страниц posts и users через WSGI-приложение.
+
+Запросы идут прямо в yatube.wsgi.application, минуя сеть и сервер,
+поэтому в замер попадает весь стек Django: middleware, кэш, ORM и
+шаблоны. Число SQL-запросов берется из core.queries.view_stats,
+которую ведет QueryBudgetMiddleware. Пишущие адреса не замеряются:
+они изменили бы данные, и повторные прогоны перестали бы быть
+сравнимыми. Пишет только вход: на время прогона создаются сессии
+читателя и автора (и обновляется их last_login), по окончании сессии
+удаляются.
+
+Ленты гостям отдаются из кэша страниц, поэтому у них есть варианты
++cold с уникальным параметром nocache: каждый такой запрос проходит
+представление целиком, и регрессии в нем видны.
+"""
+import itertools
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .queries import view_stats
+
+PERCENTILES = (50, 95, 99)
+# Страницы, которые гостям отдаются из кэша (posts.generations).
+CACHED_PAGES = (
+    'posts:index', 'posts:index_by_tag', 'posts:group_list', 'posts:profile',
+)
+
+
+class Scenario:
+    """Адрес, который запрашивается от имени гостя или пользователя.
+
+    С bust_cache к адресу добавляется новый параметр nocache, то есть
+    новый ключ cache_page, и страница каждый раз рендерится заново.
+    """
+
+    def __init__(self, name, url, cookie='', bust_cache=False):
+        self.name = name
+        self.url = url
+        self.cookie = cookie
+        self.bust_cache = bust_cache
+        self._numbers = itertools.count()
+
+    def environ(self):
+        parts = urlsplit(self.url)
+        query = parts.query
+        if self.bust_cache:
+            query = '&'.join(
+                filter(None, (query, f'nocache={next(self._numbers)}'))
+            )
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else ''
+        return {
+            'REQUEST_METHOD': 'GET',
+            'SCRIPT_NAME': '',
+            # WSGI передает путь раскодированными байтами в latin-1.
+            'PATH_INFO': unquote_to_bytes(parts.path).decode('iso-8859-1'),
+            'QUERY_STRING': query,
+            'SERVER_NAME': host or 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': host or 'localhost',
+            'HTTP_ACCEPT_ENCODING': 'gzip',
+            'HTTP_COOKIE': self.cookie,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+
+
+@contextmanager
+def logged_in(*users):
+    """Cookie сессий пользователей; по выходу сессии удаляются."""
+    clients = []
+    try:
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        yield [
+            f'{settings.SESSION_COOKIE_NAME}='
+            f'{client.cookies[settings.SESSION_COOKIE_NAME].value}'
+            for client in clients
+        ]
+    finally:
+        for client in clients:
+            client.logout()
+
+
+def build_scenarios(author, reader, post, group, tag, query,
+                    reader_cookie, author_cookie):
+    """Все читающие адреса posts и users.
+
+    author - автор post, reader - пользователь с подписками, от имени
+    которого открываются страницы для вошедших (cookie из logged_in).
+    """
+    uid = urlsafe_base64_encode(force_bytes(reader.pk))
+    token = default_token_generator.make_token(reader)
+    pages = [
+        ('posts:index', reverse('posts:index'), ''),
+        ('posts:index_by_tag',
+         reverse('posts:index_by_tag', args=(tag,)), ''),
+        ('posts:search_results',
+         f'{reverse("posts:search_results")}?{urlencode({"q": query})}',
+         ''),
+        ('posts:group_list', reverse('posts:group_list', args=(group,)), ''),
+        ('posts:groups', reverse('posts:groups'), ''),
+        ('posts:authors_list', reverse('posts:authors_list'), ''),
+        ('posts:profile',
+         reverse('posts:profile', args=(author.username,)), ''),
+        ('posts:profile+auth',
+         reverse('posts:profile', args=(author.username,)), reader_cookie),
+        ('posts:post_detail',
+         reverse('posts:post_detail', args=(post.pk,)), ''),
+        ('posts:post_detail+auth',
+         reverse('posts:post_detail', args=(post.pk,)), reader_cookie),
+        ('posts:follow_index', reverse('posts:follow_index'), reader_cookie),
+        ('posts:post_create', reverse('posts:post_create'), reader_cookie),
+        ('posts:post_edit',
+         reverse('posts:post_edit', args=(post.pk,)), author_cookie),
+        ('users:user_profile', reverse('users:user_profile'), reader_cookie),
+        ('users:signup', reverse('users:signup'), ''),
+        ('users:login', reverse('users:login'), ''),
+        ('users:password_change',
+         reverse('users:password_change'), reader_cookie),
+        ('users:password_change_done',
+         reverse('users:password_change_done'), reader_cookie),
+        ('users:password_reset', reverse('users:password_reset'), ''),
+        ('users:password_reset_done',
+         reverse('users:password_reset_done'), ''),
+        ('users:password_reset_confirm',
+         reverse('users:password_reset_confirm', args=(uid, token)), ''),
+        ('users:password_reset_complete',
+         reverse('users:password_reset_complete'), ''),
+    ]
+    scenarios = [Scenario(name, url, cookie) for name, url, cookie in pages]
+    scenarios.extend(
+        Scenario(f'{name}+cold', url, bust_cache=True)
+        for name, url, cookie in pages
+        if name in CACHED_PAGES and not cookie
+    )
+    return scenarios
+
+
+def _request(application, scenario):
+    """Один запрос; возвращает длительность в секундах и код ответа."""
+    status = []
+
+    def start_response(response_status, headers, exc_info=None):
+        status.append(int(response_status.split()[0]))
+
+    start = time.perf_counter()
+    response = application(scenario.environ(), start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return time.perf_counter() - start, status[0]
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(0, round(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _total_queries():
+    return sum(stats['queries'] for stats in view_stats.snapshot().values())
+
+
+def worker_pool(concurrency):
+    """Потоки, которые подключаются к базе при старте.
+
+    Иначе PRAGMA нового соединения попали бы в счетчик SQL первых
+    запросов.
+    """
+    return ThreadPoolExecutor(
+        max_workers=concurrency,
+        thread_name_prefix='benchmark',
+        initializer=lambda: connection.ensure_connection(),
+    )
+
+
+def run_scenario(application, scenario, requests, pool=None, warmup=0):
+    """Прогоняет сценарий requests раз; pool=None - в текущем потоке."""
+    run = map if pool is None else pool.map
+    list(run(lambda _: _request(application, scenario), range(warmup)))
+    queries_before = _total_queries()
+    start = time.perf_counter()
+    results = list(run(
+        lambda _: _request(application, scenario), range(requests)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies = [duration for duration, _ in results]
+    result = {
+        'url': scenario.url,
+        'requests': requests,
+        'errors': sum(1 for _, status in results if status >= 500),
+        'statuses': sorted({status for _, status in results}),
+        'throughput': requests / elapsed,
+        'queries_per_request': (_total_queries() - queries_before) / requests,
+    }
+    for percent in PERCENTILES:
+        result[f'p{percent}_ms'] = percentile(latencies, percent) * 1000
+    return result
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux в килобайтах.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def compare(results, baseline, threshold):
+    """Изменения p95 и пропускной способности относительно baseline.
+
+    Возвращает строки отчета и список регрессий - сценариев, где p95
+    вырос или пропускная способность упала больше чем на threshold.
+    """
+    lines = []
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            lines.append(f'{name}: нет в базовом прогоне')
+            continue
+        p95 = current['p95_ms'] / previous['p95_ms'] - 1
+        throughput = current['throughput'] / previous['throughput'] - 1
+        queries = (current['queries_per_request']
+                   - previous['queries_per_request'])
+        regressed = p95 > threshold or -throughput > threshold
+        if regressed:
+            regressions.append(name)
+        lines.append(
+            f'{"!" if regressed else " "} {name}: '
+            f'p95 {previous["p95_ms"]:.1f} -> {current["p95_ms"]:.1f} мс '
+            f'({p95:+.0%}), '
+            f'rps {previous["throughput"]:.0f} -> '
+            f'{current["throughput"]:.0f} ({throughput:+.0%}), '
+            f'запросов к БД {queries:+.1f}'
+        )
+    return lines, regressions
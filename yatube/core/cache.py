@@ -0,0 +1,35 @@
+"""Бэкенды кэша, которые считают попадания и промахи в core.metrics."""
+from django.core.cache.backends import locmem, memcached
+
+from . import metrics
+
+_missing = object()
+
+
+class CountingMixin:
+    def _count(self, key, hit):
+        metrics.CACHE_REQUESTS.inc(
+            prefix=metrics.cache_key_prefix(key),
+            result='hit' if hit else 'miss',
+        )
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _missing, version)
+        self._count(key, value is not _missing)
+        return default if value is _missing else value
+
+
+class LocMemCache(CountingMixin, locmem.LocMemCache):
+    # get_many в BaseCache читает ключи через get(), так что и пакетные
+    # чтения (карточки постов) попадают в счетчик.
+    pass
+
+
+class PyMemcacheCache(CountingMixin, memcached.PyMemcacheCache):
+    """Общий для всех процессов кэш: поколения лент и страницы."""
+
+    def get_many(self, keys, version=None):
+        values = super().get_many(keys, version)
+        for key in keys:
+            self._count(key, key in values)
+        return values
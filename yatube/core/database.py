@@ -0,0 +1,16 @@
+"""Настройка соединений с SQLite для конкурентной нагрузки."""
+from django.conf import settings
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Выставляет SQLITE_PRAGMAS каждому новому соединению.
+
+    WAL позволяет читать параллельно с записью, synchronous=NORMAL
+    в режиме WAL не теряет целостность при сбое процесса, а
+    busy_timeout заставляет ждать блокировку вместо ошибки.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
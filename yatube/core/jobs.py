@@ -0,0 +1,170 @@
+"""Очередь фоновых задач в базе данных.
+
+Сигналы и представления ставят медленную работу в очередь через
+enqueue() в той же транзакции, что и основную запись, и сразу отвечают
+пользователю. Команда run_jobs забирает задачи пачками и выполняет их
+в пуле потоков. Неудачные задачи повторяются с растущей задержкой,
+ключ идемпотентности не дает поставить одну и ту же работу дважды,
+а задачи с batch=True получают сразу все накопившиеся параметры.
+"""
+import logging
+import os
+import socket
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def task(max_attempts=None, batch=False):
+    """Помечает функцию как фоновую задачу.
+
+    Обычная задача вызывается с параметрами как именованными
+    аргументами, задача с batch=True - со списком словарей параметров.
+    """
+    def decorator(func):
+        func.max_attempts = max_attempts
+        func.batch = batch
+        return func
+    return decorator
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, key='', delay=None, **payload):
+    """Ставит задачу в очередь; None, если такой ключ уже ждет."""
+    job = Job(
+        task=task_name(func),
+        payload=payload,
+        key=key,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    return (
+        Q(status=Job.QUEUED, run_after__lte=now)
+        | Q(status=Job.RUNNING, locked_at__lt=stale)
+    )
+
+
+def claim(worker, limit):
+    """Забирает до limit готовых задач, включая брошенные упавшими
+    обработчиками."""
+    now = timezone.now()
+    ids = list(
+        Job.objects.filter(_claimable(now))
+        .order_by('run_after', 'pk')
+        .values_list('pk', flat=True)[:limit]
+    )
+    Job.objects.filter(_claimable(now), pk__in=ids).update(
+        status=Job.RUNNING, locked_by=worker, locked_at=now
+    )
+    return list(
+        Job.objects.filter(
+            pk__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now
+        ).order_by('pk')
+    )
+
+
+def _retry(jobs, func, error):
+    max_attempts = func.max_attempts or settings.JOB_MAX_ATTEMPTS
+    for job in jobs:
+        attempts = job.attempts + 1
+        if attempts >= max_attempts:
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.FAILED, attempts=attempts, last_error=error
+            )
+            continue
+        delay = settings.JOB_RETRY_DELAY * 2 ** (attempts - 1)
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.QUEUED,
+                    attempts=F('attempts') + 1,
+                    run_after=timezone.now() + timedelta(seconds=delay),
+                    last_error=error,
+                )
+        except IntegrityError:
+            # Та же работа уже снова стоит в очереди.
+            Job.objects.filter(pk=job.pk).delete()
+
+
+def _run(func, jobs):
+    try:
+        with transaction.atomic():
+            if func.batch:
+                func([job.payload for job in jobs])
+            else:
+                func(**jobs[0].payload)
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', jobs[0].task)
+        _retry(jobs, func, traceback.format_exc())
+
+
+def _run_in_thread(func, jobs):
+    try:
+        _run(func, jobs)
+    finally:
+        close_old_connections()
+
+
+def _units(jobs):
+    """Группирует задачи: пакетные - по задаче, остальные - по одной."""
+    by_task = defaultdict(list)
+    for job in jobs:
+        by_task[job.task].append(job)
+    for name, task_jobs in by_task.items():
+        try:
+            func = import_string(name)
+        except ImportError:
+            Job.objects.filter(pk__in=[job.pk for job in task_jobs]).update(
+                status=Job.FAILED, last_error=traceback.format_exc()
+            )
+            continue
+        if func.batch:
+            yield func, task_jobs
+        else:
+            for job in task_jobs:
+                yield func, [job]
+
+
+def run_pending(worker=None, limit=None, pool=None):
+    """Выполняет одну пачку задач и возвращает число взятых задач."""
+    jobs = claim(
+        worker or worker_name(), limit or settings.JOB_BATCH_SIZE
+    )
+    if pool is None:
+        for func, unit in _units(jobs):
+            _run(func, unit)
+    else:
+        futures = [
+            pool.submit(_run_in_thread, func, unit)
+            for func, unit in _units(jobs)
+        ]
+        for future in futures:
+            future.result()
+    return len(jobs)
@@ -0,0 +1,141 @@
+import json
+import platform
+from contextlib import nullcontext
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from taggit.models import Tag
+
+from core import benchmark
+from posts.models import Follow, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет задержки (p50/p95/p99), пропускную способность и число '
+        'SQL-запросов страниц posts и users через WSGI-приложение. '
+        'Базу заранее заполняет manage.py seed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждый адрес',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Число одновременных запросов, 1 - в основном потоке',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Запросов на прогрев перед замером',
+        )
+        parser.add_argument(
+            '--only', nargs='+', default=None,
+            help='Прогнать только эти сценарии (например, posts:index)',
+        )
+        parser.add_argument('--output', help='Куда сохранить JSON с итогами')
+        parser.add_argument('--baseline', help='JSON прошлого прогона')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Допустимое ухудшение p95 и rps, доля (0.1 - 10%%)',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Завершиться с ошибкой, если есть регрессии',
+        )
+
+    def sample_data(self):
+        post = Post.objects.order_by('-comments_count', '-pk').first()
+        if post is None:
+            raise CommandError('База пуста: сначала выполните manage.py seed')
+        reader = User.objects.filter(
+            pk__in=Follow.objects.values('user')[:1]
+        ).first() or User.objects.exclude(pk=post.author_id).first()
+        if reader is None:
+            raise CommandError('Нужен хотя бы один пользователь кроме автора')
+        group = Group.objects.order_by('-posts_count').first()
+        tag = Tag.objects.annotate(
+            total=Count('taggit_taggeditem_items')
+        ).order_by('-total').first()
+        if group is None or tag is None:
+            raise CommandError('Нужны хотя бы одна группа и один тег')
+        query = post.text.split()[0]
+        return post.author, reader, post, group.slug, tag.slug, query
+
+    def report(self, name, result):
+        errors = f', ошибок: {result["errors"]}' if result['errors'] else ''
+        self.stdout.write(
+            f'{name}: p50 {result["p50_ms"]:.1f} мс, '
+            f'p95 {result["p95_ms"]:.1f} мс, '
+            f'p99 {result["p99_ms"]:.1f} мс, '
+            f'{result["throughput"]:.0f} запр/с, '
+            f'{result["queries_per_request"]:.1f} SQL на запрос{errors}'
+        )
+
+    def run(self, application, scenarios, options):
+        results = {
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'debug': settings.DEBUG,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'scenarios': {},
+        }
+        pool = nullcontext()
+        if options['concurrency'] > 1:
+            pool = benchmark.worker_pool(options['concurrency'])
+        with pool as pool:
+            for scenario in scenarios:
+                result = benchmark.run_scenario(
+                    application,
+                    scenario,
+                    options['requests'],
+                    pool,
+                    options['warmup'],
+                )
+                results['scenarios'][scenario.name] = result
+                self.report(scenario.name, result)
+        return results
+
+    def handle(self, *args, **options):
+        from yatube.wsgi import application
+
+        if settings.DEBUG:
+            self.stderr.write(self.style.WARNING(
+                'DEBUG включен: шаблоны не кэшируются, запросы копятся '
+                'в памяти, цифры будут хуже боевых'
+            ))
+        author, reader, *sample = self.sample_data()
+        with benchmark.logged_in(reader, author) as cookies:
+            scenarios = benchmark.build_scenarios(
+                author, reader, *sample, *cookies
+            )
+            if options['only']:
+                scenarios = [
+                    scenario for scenario in scenarios
+                    if scenario.name in options['only']
+                ]
+            results = self.run(application, scenarios, options)
+        results['peak_rss_mb'] = benchmark.peak_rss_mb()
+        self.stdout.write(f'Пиковая память: {results["peak_rss_mb"]:.0f} МБ')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, ensure_ascii=False)
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            lines, regressions = benchmark.compare(
+                results, baseline, options['threshold']
+            )
+            for line in lines:
+                self.stdout.write(line)
+            if regressions and options['fail_on_regression']:
+                raise CommandError(
+                    f'Регрессии: {", ".join(regressions)}'
+                )
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.thumbnails import generate
+from posts.models import Post
+from users.models import Profile
+
+SOURCES = (
+    (Post, 'image', 'post_image'),
+    (Profile, 'photo', 'profile_photo'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Нарезает превью для всех уже загруженных картинок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.THUMBNAIL_WORKERS,
+            help='Число потоков нарезки',
+        )
+
+    def files(self):
+        for model, field_name, preset in SOURCES:
+            storage = model._meta.get_field(field_name).storage
+            names = model.objects.exclude(
+                **{field_name: ''}
+            ).values_list(field_name, flat=True).distinct()
+            for name in names.iterator():
+                yield name, storage, preset
+
+    def generate(self, name, storage, preset):
+        try:
+            generate(name, storage, preset)
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(self.generate, *source): source[0]
+                for source in self.files()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано файлов: {done}, ошибок: {failed}'
+        ))
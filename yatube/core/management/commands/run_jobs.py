@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_pending, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.JOB_WORKERS,
+            help='Число потоков обработки, 0 - выполнять в основном потоке',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.JOB_BATCH_SIZE,
+            help='Сколько задач забирать из очереди за раз',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и выйти',
+        )
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        done = 0
+        pool = nullcontext()
+        if options['workers']:
+            pool = ThreadPoolExecutor(
+                max_workers=options['workers'], thread_name_prefix='jobs'
+            )
+        with pool as pool:
+            while True:
+                processed = run_pending(worker, options['batch_size'], pool)
+                done += processed
+                if options['once'] and not processed:
+                    break
+                if not processed:
+                    time.sleep(settings.JOB_POLL_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
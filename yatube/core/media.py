@@ -0,0 +1,103 @@
+"""Учет ссылок на файлы картинок.
+
+Одинаковые загрузки хранятся одним файлом (core.storage), поэтому
+удалять файл и его версии можно, только когда на него не осталось
+ссылок. track() подключает к полю модели сигналы, которые ведут счетчик
+MediaFile.references и нарезают превью только для новых файлов.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_save)
+
+from . import thumbnails
+from .models import MediaFile
+
+
+def acquire(name):
+    """Добавляет ссылку на файл; True, если это первая ссылка."""
+    if MediaFile.objects.filter(name=name).update(
+        references=F('references') + 1
+    ):
+        return False
+    try:
+        with transaction.atomic():
+            MediaFile.objects.create(name=name, references=1)
+    except IntegrityError:
+        return acquire(name)
+    return True
+
+
+def _delete_unreferenced(name, storage, preset):
+    if MediaFile.objects.filter(name=name).exists():
+        return
+    thumbnails.delete(name, storage, preset)
+    storage.delete(name)
+
+
+def release(name, storage, preset):
+    """Снимает ссылку и удаляет файл вместе с версиями, если она последняя.
+
+    Файлы удаляются после фиксации транзакции и только если за это время
+    никто не загрузил тот же файл снова.
+    """
+    MediaFile.objects.filter(name=name, references__gt=0).update(
+        references=F('references') - 1
+    )
+    deleted, _ = MediaFile.objects.filter(name=name, references=0).delete()
+    if deleted:
+        transaction.on_commit(
+            lambda: _delete_unreferenced(name, storage, preset)
+        )
+
+
+def track(model, field_name, preset):
+    """Ведет счетчик ссылок и нарезку превью для поля-картинки модели."""
+    attname = f'_{field_name}_stored'
+
+    def remember(sender, instance, **kwargs):
+        value = instance.__dict__.get(field_name)
+        if isinstance(value, str):
+            setattr(instance, attname, value)
+
+    def written(instance, update_fields):
+        # Отложенное (only/defer) поле Django в UPDATE не включает.
+        if update_fields is not None and field_name not in update_fields:
+            return False
+        return field_name not in instance.get_deferred_fields()
+
+    def load_stored(sender, instance, update_fields, using, **kwargs):
+        # Поле подгрузили уже после создания объекта, и прежнее имя
+        # неизвестно: берем его из базы, пока UPDATE его не перезаписал.
+        if (instance._state.adding or hasattr(instance, attname)
+                or not written(instance, update_fields)):
+            return
+        stored = sender._base_manager.using(using).filter(
+            pk=instance.pk
+        ).values_list(field_name, flat=True).first()
+        setattr(instance, attname, stored or '')
+
+    def update(sender, instance, created, update_fields, **kwargs):
+        if not written(instance, update_fields):
+            return
+        field_file = getattr(instance, field_name)
+        old_name = '' if created else getattr(instance, attname, '')
+        new_name = field_file.name or ''
+        if new_name == old_name:
+            return
+        if new_name and acquire(new_name):
+            thumbnails.schedule(field_file, preset)
+        if old_name:
+            release(old_name, field_file.storage, preset)
+        setattr(instance, attname, new_name)
+
+    def forget(sender, instance, **kwargs):
+        field_file = getattr(instance, field_name)
+        if field_file.name:
+            release(field_file.name, field_file.storage, preset)
+
+    uid = f'media.{model._meta.label}.{field_name}'
+    post_init.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    pre_save.connect(load_stored, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(update, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(forget, sender=model, weak=False, dispatch_uid=uid)
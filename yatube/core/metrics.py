@@ -0,0 +1,285 @@
+"""Метрики в текстовом формате Prometheus.
+
+Каждый процесс копит счетчики и гистограммы в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл
+<hostname>-<pid>.json в METRICS_DIR. Представление /metrics складывает
+файлы всех процессов, поэтому gunicorn с несколькими воркерами отдает
+общую картину, а не данные одного случайного воркера.
+
+Файлы завершившихся процессов при сборе переносятся в archive.json,
+так что счетчики не убывают, а файлов в каталоге не больше, чем живых
+воркеров. Процесс, получивший PID завершившегося, сначала переносит в
+архив его файл, а потом пишет свой. Если каталог общий для нескольких
+машин, каждая архивирует только файлы своих процессов: PID с чужой
+машины ничего не говорит о том, жив ли процесс. После деплоя каталог можно
+очищать: Prometheus воспринимает это как обычный сброс счетчиков.
+"""
+import fcntl
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+SIZE_BUCKETS = tuple(2 ** power for power in range(8, 23, 2))
+CACHE_PREFIX_RE = re.compile(r'[a-z_]+(?:[.:][a-z_]+)*(?=[.:]|$)')
+PROCESS_FILE_RE = re.compile(r'^(?P<host>.+)-(?P<pid>\d+)\.json$')
+ARCHIVE_FILE = 'archive.json'
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = 0.0
+_own_file = None
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+
+    def inc(self, amount=1, **labels):
+        key = (self.name, tuple(sorted(labels.items())))
+        with _lock:
+            _counters[key] = _counters.get(key, 0) + amount
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = (self.name, tuple(sorted(labels.items())))
+        with _lock:
+            state = _histograms.setdefault(key, {
+                'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0,
+            })
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+
+REQUEST_DURATION = Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса по view.'
+)
+RESPONSE_SIZE = Histogram(
+    'yatube_response_size_bytes', 'Размер тела ответа по view.', SIZE_BUCKETS
+)
+DB_DURATION = Histogram(
+    'yatube_db_duration_seconds', 'Время SQL-запросов за запрос по view.'
+)
+TEMPLATE_DURATION = Histogram(
+    'yatube_template_render_seconds', 'Время отрисовки шаблона.'
+)
+CACHE_REQUESTS = Counter(
+    'yatube_cache_requests', 'Чтения из кэша по префиксу ключа.'
+)
+METRICS = (
+    REQUEST_DURATION, RESPONSE_SIZE, DB_DURATION, TEMPLATE_DURATION,
+    CACHE_REQUESTS,
+)
+
+
+def cache_key_prefix(key):
+    """Постоянная часть ключа кэша, без хешей, номеров и версий."""
+    match = CACHE_PREFIX_RE.match(str(key))
+    return match.group() if match else 'other'
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [
+                [name, dict(labels), value]
+                for (name, labels), value in _counters.items()
+            ],
+            'histograms': [
+                [name, dict(labels), dict(state, buckets=state['buckets'][:])]
+                for (name, labels), state in _histograms.items()
+            ],
+        }
+
+
+def _path(file_name):
+    return os.path.join(settings.METRICS_DIR, file_name)
+
+
+def _write(path, data):
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=settings.METRICS_DIR, suffix='.tmp'
+    )
+    with os.fdopen(descriptor, 'w') as temp_file:
+        json.dump(data, temp_file)
+    os.replace(temp_path, path)
+
+
+def _load(path):
+    try:
+        with open(path) as metrics_file:
+            return json.load(metrics_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _add(counters, histograms, data):
+    """Прибавляет к итогам метрики из снимка процесса."""
+    for name, labels, value in data['counters']:
+        key = (name, tuple(sorted(labels.items())))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, state in data['histograms']:
+        key = (name, tuple(sorted(labels.items())))
+        total = histograms.setdefault(key, {
+            'buckets': [0] * len(state['buckets']),
+            'sum': 0.0,
+            'count': 0,
+        })
+        for index, count in enumerate(state['buckets']):
+            total['buckets'][index] += count
+        total['sum'] += state['sum']
+        total['count'] += state['count']
+
+
+def _process_file_name(pid):
+    return f'{socket.gethostname()}-{pid}.json'
+
+
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _archive(file_names):
+    """Переносит файлы завершившихся процессов в archive.json."""
+    if not file_names:
+        return
+    with open(_path('archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Пока ждали блокировку, файлы мог перенести другой процесс.
+        paths = [
+            _path(name) for name in file_names if os.path.exists(_path(name))
+        ]
+        if not paths:
+            return
+        counters, histograms = {}, {}
+        for path in [_path(ARCHIVE_FILE), *paths]:
+            data = _load(path)
+            if data is not None:
+                _add(counters, histograms, data)
+        _write(_path(ARCHIVE_FILE), {
+            'counters': [
+                [name, dict(labels), value]
+                for (name, labels), value in counters.items()
+            ],
+            'histograms': [
+                [name, dict(labels), state]
+                for (name, labels), state in histograms.items()
+            ],
+        })
+        for path in paths:
+            os.remove(path)
+
+
+def flush(force=False):
+    """Записывает метрики процесса в METRICS_DIR, если пора."""
+    global _last_flush, _own_file
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    file_name = _process_file_name(os.getpid())
+    path = _path(file_name)
+    if _own_file != path:
+        # Файл с нашим PID остался от завершившегося процесса.
+        _archive([file_name])
+        _own_file = path
+    _write(path, _snapshot())
+
+
+def _collect():
+    """Складывает метрики из файлов всех процессов и архива."""
+    hostname = socket.gethostname()
+    finished = []
+    for file_name in os.listdir(settings.METRICS_DIR):
+        match = PROCESS_FILE_RE.match(file_name)
+        if (match and match['host'] == hostname
+                and not _is_running(int(match['pid']))):
+            finished.append(file_name)
+    _archive(finished)
+    counters = {}
+    histograms = {}
+    for file_name in os.listdir(settings.METRICS_DIR):
+        if not file_name.endswith('.json'):
+            continue
+        data = _load(_path(file_name))
+        if data is not None:
+            _add(counters, histograms, data)
+    return counters, histograms
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', r'\\').replace('"', r'\"')
+            .replace('\n', r'\n'),
+        )
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render():
+    """Текст для Prometheus по всем процессам."""
+    flush(force=True)
+    counters, histograms = _collect()
+    lines = []
+    for metric in METRICS:
+        is_histogram = isinstance(metric, Histogram)
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(
+            f'# TYPE {metric.name} '
+            f'{"histogram" if is_histogram else "counter"}'
+        )
+        if not is_histogram:
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric.name:
+                    lines.append(
+                        f'{name}_total{_format_labels(labels)} {value}'
+                    )
+            continue
+        for (name, labels), state in sorted(histograms.items()):
+            if name != metric.name:
+                continue
+            for bound, count in zip(metric.buckets, state['buckets']):
+                lines.append(
+                    f'{name}_bucket{_format_labels(labels, le=bound)} {count}'
+                )
+            lines.append(
+                f'{name}_bucket{_format_labels(labels, le="+Inf")} '
+                f'{state["count"]}'
+            )
+            lines.append(f'{name}_sum{_format_labels(labels)} {state["sum"]}')
+            lines.append(
+                f'{name}_count{_format_labels(labels)} {state["count"]}'
+            )
+    return '\n'.join(lines) + '\n'
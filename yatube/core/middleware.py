@@ -0,0 +1,232 @@
+import logging
+import mimetypes
+import os
+import posixpath
+import random
+import time
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import OperationalError, connection, transaction
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from . import metrics
+from .queries import record_queries, view_stats
+from .routers import use_primary
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+PRIMARY_COOKIE = 'use_primary_until'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=60'
+
+
+class StaticFilesMiddleware:
+    """Отдает собранную collectstatic статику из STATIC_ROOT.
+
+    Файлы с хешем в имени никогда не меняются и отдаются с Cache-Control
+    immutable на год. Клиенту, который принимает gzip, отдается готовая
+    .gz-копия. Запросы к файлам, которых нет в STATIC_ROOT, проходят
+    дальше по цепочке.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.hashed_names = None
+
+    def __call__(self, request):
+        if (request.method in ('GET', 'HEAD') and settings.STATIC_ROOT
+                and request.path.startswith(settings.STATIC_URL)):
+            response = self.serve(
+                request, request.path[len(settings.STATIC_URL):]
+            )
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def is_immutable(self, name):
+        if self.hashed_names is None:
+            self.hashed_names = set(
+                getattr(staticfiles_storage, 'hashed_files', {}).values()
+            )
+        return name in self.hashed_names
+
+    def serve(self, request, name):
+        name = posixpath.normpath(unquote(name)).lstrip('/')
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        encoding = None
+        if ('gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+                and os.path.isfile(path + '.gz')):
+            path, encoding = path + '.gz', 'gzip'
+        stat = os.stat(path)
+        if not was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'),
+            stat.st_mtime,
+            stat.st_size,
+        ):
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(name)
+            response = FileResponse(
+                open(path, 'rb'),
+                content_type=content_type or 'application/octet-stream',
+            )
+            response['Content-Length'] = stat.st_size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if self.is_immutable(name)
+            else MUTABLE_CACHE_CONTROL
+        )
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class SQLiteWriteRetryMiddleware:
+    """Повторяет пишущий запрос, если SQLite ответил «database is locked».
+
+    Представление для POST и других небезопасных методов выполняется
+    в транзакции, поэтому неудачная попытка откатывается целиком и ее
+    можно повторить с растущей случайной задержкой. Middleware должен
+    стоять последним: его process_view сам вызывает представление.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS or connection.vendor != 'sqlite':
+            return None
+        retries = settings.SQLITE_WRITE_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                with transaction.atomic():
+                    return view_func(request, *view_args, **view_kwargs)
+            except OperationalError as error:
+                if 'locked' not in str(error) or attempt == retries:
+                    raise
+                logger.warning(
+                    'База заблокирована, повтор %s для %s',
+                    attempt + 1,
+                    request.path,
+                )
+                delay = settings.SQLITE_RETRY_DELAY * 2 ** attempt
+                time.sleep(delay + random.uniform(0, delay))
+
+
+class ReadYourWritesMiddleware:
+    """Закрепляет за основной базой запросы пользователя после записи.
+
+    Пишущий запрос целиком идет в основную базу и ставит cookie на
+    READ_YOUR_WRITES_SECONDS. Пока cookie действует, чтение этого
+    пользователя тоже идет в основную базу и не видит отставания реплик.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        try:
+            pinned_until = float(request.COOKIES.get(PRIMARY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        token = use_primary.set(writes or pinned_until > time.time())
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        if writes:
+            window = settings.READ_YOUR_WRITES_SECONDS
+            response.set_cookie(
+                PRIMARY_COOKIE,
+                str(time.time() + window),
+                max_age=window,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы и их время по имени представления.
+
+    Итоги копятся в core.queries.view_stats. В лог пишутся запросы
+    сверх бюджета view из QUERY_BUDGETS и повторы одной формы запроса,
+    то есть вероятные N+1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        request.query_recorder = recorder
+        match = request.resolver_match
+        if match is None:
+            return response
+        view_name = match.view_name
+        view_stats.add(view_name, recorder)
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                '%s: %d SQL-запросов при бюджете %d',
+                view_name, recorder.count, budget,
+            )
+        for shape, count in recorder.repeated().items():
+            logger.warning(
+                '%s: запрос повторен %d раз (N+1?): %s',
+                view_name, count, shape,
+            )
+        logger.debug(
+            '%s: %d SQL-запросов за %.1f мс',
+            view_name, recorder.count, recorder.duration * 1000,
+        )
+        return response
+
+
+class MetricsMiddleware:
+    """Снимает для core.metrics время запроса, размер ответа и время SQL.
+
+    Стоит снаружи GZipMiddleware, поэтому размер - это число байт,
+    ушедших клиенту. Время SQL берется у QueryBudgetMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        if match is not None:
+            view = match.view_name
+            metrics.REQUEST_DURATION.observe(duration, view=view)
+            if not response.streaming:
+                metrics.RESPONSE_SIZE.observe(
+                    len(response.content), view=view
+                )
+            recorder = getattr(request, 'query_recorder', None)
+            if recorder is not None:
+                metrics.DB_DURATION.observe(recorder.duration, view=view)
+        metrics.flush()
+        return response
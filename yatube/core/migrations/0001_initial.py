@@ -0,0 +1,47 @@
+# Generated by Django 3.2 on 2026-10-18 12:05
+
+from collections import Counter
+
+from django.db import migrations, models
+
+SOURCES = (('posts', 'Post', 'image'), ('users', 'Profile', 'photo'))
+
+
+def count_references(apps, schema_editor):
+    references = Counter()
+    for app_label, model_name, field_name in SOURCES:
+        model = apps.get_model(app_label, model_name)
+        references.update(
+            model.objects.exclude(**{field_name: ''}).values_list(
+                field_name, flat=True
+            ).iterator()
+        )
+    apps.get_model('core', 'MediaFile').objects.bulk_create(
+        apps.get_model('core', 'MediaFile')(name=name, references=count)
+        for name, count in references.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('posts', '0019_group_posts_count'),
+        ('users', '0004_alter_profile_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+from django.db import models
+from django.utils import timezone
+
+
+class MediaFile(models.Model):
+    """Файл в хранилище и число ссылающихся на него записей."""
+
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class Job(models.Model):
+    """Отложенная задача, которую выполняет команда run_jobs."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField('Задача', max_length=200)
+    payload = models.JSONField('Параметры', default=dict)
+    key = models.CharField(
+        'Ключ идемпотентности',
+        max_length=200,
+        blank=True,
+        default='',
+        help_text='В очереди может быть только одна задача с этим ключом',
+    )
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    locked_by = models.CharField('Обработчик', max_length=100, blank=True)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [
+            models.Index(
+                fields=['status', 'run_after'], name='job_status_run_after_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status='queued') & ~models.Q(key=''),
+                name='job_queued_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} ({self.get_status_display()})'
@@ -0,0 +1,88 @@
+"""Учет SQL-запросов по представлениям.
+
+QueryRecorder подключается к соединениям через execute_wrapper и
+запоминает число запросов, их суммарное время и «форму» каждого
+запроса - SQL без параметров, где списки IN (%s, %s, ...) свернуты в
+один параметр. Одна и та же форма, повторенная в одном запросе
+пользователя несколько раз, почти всегда означает N+1: шаблон
+обращается к связи у каждой карточки по отдельности.
+"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+def query_shape(sql):
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, limit=None):
+        """SELECT-формы, повторенные больше limit раз.
+
+        По умолчанию limit - QUERY_REPEAT_LIMIT. Записи не считаются:
+        несколько INSERT одной формы (например, две задачи в core_job)
+        - обычное дело, а не N+1.
+        """
+        if limit is None:
+            limit = settings.QUERY_REPEAT_LIMIT
+        return {
+            shape: count
+            for shape, count in self.shapes.items()
+            if count > limit and shape.lstrip().upper().startswith('SELECT')
+        }
+
+
+@contextmanager
+def record_queries():
+    """Считает запросы ко всем базам внутри блока."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class ViewStats:
+    """Накопленные с запуска процесса запросы и время SQL по view."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(lambda: {
+            'requests': 0, 'queries': 0, 'duration': 0.0,
+        })
+
+    def add(self, view_name, recorder):
+        with self._lock:
+            stats = self._views[view_name]
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['duration'] += recorder.duration
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._views.items()}
+
+
+view_stats = ViewStats()
@@ -0,0 +1,55 @@
+"""Маршрутизация чтения на реплики базы данных.
+
+Запись всегда идет в default, чтение - в одну из DATABASE_REPLICAS,
+кроме трех случаев: реплик нет, идет транзакция на default или запрос
+закреплен за основной базой middleware ReadYourWritesMiddleware
+(пользователь недавно что-то записал и должен сразу это увидеть).
+"""
+import itertools
+import random
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+use_primary = ContextVar('use_primary', default=False)
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cycle = None
+        self._cycle_replicas = None
+
+    def _round_robin(self, replicas):
+        with self._lock:
+            if self._cycle_replicas != replicas:
+                self._cycle = itertools.cycle(replicas)
+                self._cycle_replicas = replicas
+            return next(self._cycle)
+
+    def pick_replica(self):
+        replicas = tuple(settings.DATABASE_REPLICAS)
+        if settings.DATABASE_REPLICA_BALANCING == 'round_robin':
+            return self._round_robin(replicas)
+        return random.choice(replicas)
+
+    def db_for_read(self, model, **hints):
+        if (not settings.DATABASE_REPLICAS or use_primary.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return self.pick_replica()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему и данные репликацией с основной базы.
+        return db not in settings.DATABASE_REPLICAS
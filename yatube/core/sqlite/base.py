@@ -0,0 +1,14 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, в котором транзакции сразу берут блокировку на запись.
+
+    Отложенная транзакция (BEGIN), которая сначала читает, а потом
+    пишет, при конкурентной записи мгновенно падает с «database is
+    locked», не дожидаясь busy_timeout. BEGIN IMMEDIATE ждет очереди
+    на запись в начале транзакции, поэтому busy_timeout работает.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 их содержимого.
+
+    posts/cat.jpg сохраняется как posts/3f/3fa9…c1.jpg, поэтому
+    одинаковые загрузки занимают на диске один файл. Версии картинок
+    записываются под точным именем через save_derived.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        hexdigest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), hexdigest[:2], hexdigest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def save_derived(self, name, content):
+        """Записывает производный файл ровно под именем name."""
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Статика с хешем в имени и заранее сжатыми .gz-копиями.
+
+    collectstatic сжимает каждый файл с хешем, который имеет смысл
+    сжимать, чтобы core.middleware.StaticFilesMiddleware отдавал готовый
+    gzip без сжатия на лету. Пока статика не собрана (разработка,
+    тесты), ссылки ведут на исходные файлы.
+    """
+
+    manifest_strict = False
+    compressible_extensions = (
+        '.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.ico',
+    )
+    min_compression_ratio = 0.95
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if (not dry_run and hashed_name
+                    and not isinstance(processed, Exception)
+                    and hashed_name.endswith(self.compressible_extensions)):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        with self.open(name) as original:
+            data = original.read()
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) > len(data) * self.min_compression_ratio:
+            return
+        if self.exists(name + '.gz'):
+            self.delete(name + '.gz')
+        self._save(name + '.gz', ContentFile(compressed))
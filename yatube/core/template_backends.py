@@ -0,0 +1,30 @@
+"""Шаблонный бэкенд Django, который замеряет время отрисовки."""
+import time
+
+from django.template.backends import django
+
+from . import metrics
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    @property
+    def origin(self):
+        return self.template.origin
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.TEMPLATE_DURATION.observe(
+                time.perf_counter() - start,
+                template=self.origin.template_name,
+            )
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
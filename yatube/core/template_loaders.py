@@ -0,0 +1,49 @@
+import re
+
+from django.template.loaders.base import Loader as BaseLoader
+
+COLLAPSE_PREFIXES = ('posts/', 'includes/')
+TAG_LINE_RE = re.compile(r'\{%[^%]*%\}|\{#[^#]*#\}')
+
+
+def collapse_whitespace(source):
+    """Убирает отступы и пустые строки из исходника шаблона.
+
+    Переводы строк между строками текста сохраняются, поэтому соседние
+    слова не склеиваются, а однострочные комментарии в <script>
+    продолжают работать. Строка, в которой только тег шаблона, не дает
+    в выводе пустой строки.
+    """
+    parts = []
+    for line in source.splitlines():
+        line = line.strip()
+        if line:
+            parts.append(line if TAG_LINE_RE.fullmatch(line) else line + '\n')
+    return ''.join(parts)
+
+
+class Loader(BaseLoader):
+    """Загрузчик-обертка, который сжимает пробелы в шаблонах лент.
+
+    Сжатие выполняется один раз при загрузке исходника, а не при каждом
+    рендере; вместе с cached.Loader шаблон разбирается уже сжатым.
+    """
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine)
+        self.loaders = engine.get_template_loaders(loaders)
+
+    def get_template_sources(self, template_name):
+        for loader in self.loaders:
+            yield from loader.get_template_sources(template_name)
+
+    def get_contents(self, origin):
+        contents = origin.loader.get_contents(origin)
+        if origin.template_name.startswith(COLLAPSE_PREFIXES):
+            return collapse_whitespace(contents)
+        return contents
+
+    def reset(self):
+        for loader in self.loaders:
+            if hasattr(loader, 'reset'):
+                loader.reset()
@@ -0,0 +1,71 @@
+from django import template
+from django.utils.html import format_html
+
+from core.thumbnails import (FORMATS, get_rendition, rendition_height,
+                             rendition_name, renditions_ready)
+
+register = template.Library()
+
+
+def _srcset(field_file, rendition, widths, extension):
+    storage = field_file.storage
+    return ', '.join(
+        '{} {}w'.format(
+            storage.url(
+                rendition_name(field_file.name, rendition, width, extension)
+            ),
+            width,
+        )
+        for width in widths
+    )
+
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, field_file, rendition, sizes, css_class='',
+                     width=None):
+    """<picture> с WebP- и JPEG-версиями картинки разной ширины.
+
+    width - ширина картинки на странице, по умолчанию самая большая
+    версия. Пока фоновая нарезка не закончилась, отдается оригинал:
+    превью никогда не строится в потоке обработки запроса. Имя такого
+    файла добавляется в список renditions_pending из контекста, если он
+    есть, - так post_cards не кладет временную разметку в кэш.
+    """
+    options = get_rendition(rendition)
+    widths = options['widths']
+    largest = widths[-1]
+    width = width or largest
+    dimensions = ''
+    if options['crop']:
+        dimensions = format_html(
+            ' width="{}" height="{}"', width, rendition_height(options, width)
+        )
+    fallback_extension = FORMATS[-1][0]
+    fallback = rendition_name(
+        field_file.name, rendition, largest, fallback_extension
+    )
+    if not renditions_ready(field_file, rendition):
+        pending = context.get('renditions_pending')
+        if pending is not None:
+            pending.append(field_file.name)
+        return format_html(
+            '<img class="{}" src="{}"{} loading="lazy" decoding="async" '
+            'alt="">',
+            css_class,
+            field_file.url,
+            dimensions,
+        )
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}"{} '
+        'loading="lazy" decoding="async" alt="">'
+        '</picture>',
+        _srcset(field_file, rendition, widths, FORMATS[0][0]),
+        sizes,
+        css_class,
+        field_file.storage.url(fallback),
+        _srcset(field_file, rendition, widths, fallback_extension),
+        sizes,
+        dimensions,
+    )
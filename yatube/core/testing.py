@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.test import runner
+from django.test.utils import override_settings
+
+from .queries import record_queries
+
+
+class DiscoverRunner(runner.DiscoverRunner):
+    """Пишет метрики тестовых запросов во временный каталог,
+    а не в METRICS_DIR проекта."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp(prefix='metrics-')
+        self.metrics_settings = override_settings(
+            METRICS_DIR=self.metrics_dir
+        )
+        self.metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_settings.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета SQL-запросов для TestCase."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget, repeat_limit=1):
+        """Блок укладывается в budget запросов и не повторяет SELECT
+        одной формы больше repeat_limit раз."""
+        with record_queries() as recorder:
+            yield recorder
+        self.assertLessEqual(
+            recorder.count, budget,
+            f'{recorder.count} SQL-запросов при бюджете {budget}'
+        )
+        self.assertEqual(
+            recorder.repeated(repeat_limit), {}, 'Повторяющиеся запросы (N+1)'
+        )
@@ -1,4 +1,48 @@
-from django.test import Client, TestCase
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (Client, RequestFactory, TestCase,
+                         override_settings)
+from django.urls import resolve, reverse
+from django.utils import timezone
+from PIL import Image
+
+from core import benchmark, jobs, metrics, thumbnails
+from core.middleware import (PRIMARY_COOKIE, QueryBudgetMiddleware,
+                             ReadYourWritesMiddleware,
+                             SQLiteWriteRetryMiddleware)
+from core.models import Job, MediaFile
+from core.queries import query_shape, record_queries, view_stats
+from core.routers import ReplicaRouter
+from core.template_loaders import collapse_whitespace
+from core.uploads import normalize
+from posts.models import Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 class CoreErrorTests(TestCase):
@@ -13,3 +57,658 @@ class CoreErrorTests(TestCase):
             'core/404.html',
             'Страница 404 не использует кастомный шаблон'
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    def thumbnail_jobs(self):
+        return Job.objects.filter(task=jobs.task_name(thumbnails.generate_job))
+
+    def test_upload_schedules_thumbnails(self):
+        """Новая картинка ставит нарезку превью в очередь"""
+        post = self.create_post()
+        self.assertEqual(self.thumbnail_jobs().count(), 1)
+        post.text = 'Картинка не менялась'
+        post.save()
+        self.assertEqual(self.thumbnail_jobs().count(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertFalse(self.thumbnail_jobs().exists())
+        self.assertTrue(post.image.storage.exists(
+            thumbnails.rendition_name(post.image.name, 'card', 320, 'webp')
+        ))
+
+    def test_deferred_image_keeps_references(self):
+        """Сохранение поста без загруженной картинки не трогает ссылки"""
+        post = self.create_post()
+        name = post.image.name
+        deferred = Post.objects.defer('image').get(pk=post.pk)
+        deferred.text = 'Картинка не загружалась'
+        deferred.save()
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+        self.assertEqual(deferred.image.name, name)
+        deferred.text = 'Картинку подгрузили после создания объекта'
+        deferred.save()
+        self.assertEqual(MediaFile.objects.get(name=name).references, 1)
+        self.assertEqual(self.thumbnail_jobs().count(), 1)
+
+    def test_same_upload_is_stored_once(self):
+        """Одинаковые загрузки - один файл и одна нарезка превью"""
+        first = self.create_post()
+        second = self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.thumbnail_jobs().count(), 1)
+        self.assertEqual(
+            MediaFile.objects.get(name=first.image.name).references, 2
+        )
+
+    def test_file_is_deleted_with_last_reference(self):
+        """Файл удаляется, только когда на него не осталось ссылок"""
+        first = self.create_post()
+        second = self.create_post()
+        name, storage = first.image.name, first.image.storage
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_generate_creates_every_preset(self):
+        """Нарезаются все ширины в WebP и JPEG рядом с оригиналом"""
+        post = self.create_post()
+        thumbnails.generate(post.image.name, post.image.storage, 'post_image')
+        expected = [
+            thumbnails.rendition_name(post.image.name, rendition, width, ext)
+            for rendition, options in (
+                settings.THUMBNAIL_PRESETS['post_image'].items()
+            )
+            for width in options['widths']
+            for ext, _, _ in thumbnails.FORMATS
+        ]
+        for name in expected:
+            with self.subTest(name=name):
+                self.assertTrue(post.image.storage.exists(name))
+
+    def test_responsive_image_srcset(self):
+        """Тег строит srcset по нарезанным версиям"""
+        post = self.create_post()
+        thumbnails.delete(post.image.name, post.image.storage, 'post_image')
+        template = Template(
+            '{% load responsive_images %}'
+            '{% responsive_image post.image "card" "100vw" "card-img" %}'
+        )
+        html = template.render(Context({'post': post}))
+        self.assertIn(post.image.url, html)
+        self.assertNotIn('srcset', html)
+
+        thumbnails.generate(post.image.name, post.image.storage, 'post_image')
+        html = template.render(Context({'post': post}))
+        self.assertIn('<source type="image/webp"', html)
+        for width in settings.THUMBNAIL_PRESETS['post_image']['card'][
+            'widths'
+        ]:
+            name = thumbnails.rendition_name(
+                post.image.name, 'card', width, 'webp'
+            )
+            self.assertIn(f'{post.image.storage.url(name)} {width}w', html)
+
+    def test_cards_without_renditions_are_not_cached(self):
+        """Карточка с оригиналом вместо версий не кэшируется"""
+        cache.clear()
+        post = self.create_post()
+        template = Template('{% load post_cards %}{% post_cards posts %}')
+        context = Context({'posts': Post.objects.for_cards()})
+        self.assertNotIn('<picture>', template.render(context))
+        jobs.run_pending()
+        self.assertIn('<picture>', template.render(context))
+        with mock.patch.object(post.image.storage, 'exists') as exists:
+            with self.assertTemplateNotUsed('posts/includes/post_card.html'):
+                self.assertIn('<picture>', template.render(context))
+            Template(
+                '{% load responsive_images %}'
+                '{% responsive_image post.image "card" "100vw" %}'
+            ).render(Context({'post': post}))
+        exists.assert_not_called()
+
+
+def make_jpeg(size, orientation=None):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post_image(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image},
+        )
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_oversized_upload_is_rejected(self):
+        """Файл больше лимита не принимается и не сохраняется"""
+        response = self.post_image(make_jpeg((300, 300)))
+        self.assertEqual(
+            response.context['form'].errors['image'][0],
+            'Файл больше 0 МБ.',
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels_is_rejected(self):
+        """Картинка с большим числом пикселей отклоняется до декодирования"""
+        response = self.post_image(make_jpeg((100, 100)))
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_MAX_DIMENSION=50)
+    def test_upload_is_normalized(self):
+        """Сохраняется уменьшенная и повернутая картинка без EXIF"""
+        self.post_image(make_jpeg((300, 100), orientation=6))
+        post = Post.objects.get()
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (17, 50))
+            self.assertEqual(len(image.getexif()), 0)
+
+    def test_unknown_format_is_saved_as_png(self):
+        """Форматы, которые не отдаются браузерам, пересохраняются в PNG"""
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, 'BMP')
+        upload = SimpleUploadedFile('photo.bmp', buffer.getvalue())
+        normalized = normalize(upload)
+        self.assertEqual(normalized.name, 'photo.png')
+        self.assertEqual(normalized.content_type, 'image/png')
+
+
+calls = []
+
+
+@jobs.task()
+def record(value):
+    calls.append(value)
+
+
+@jobs.task(batch=True)
+def record_batch(payloads):
+    calls.append(sorted(payload['value'] for payload in payloads))
+
+
+@jobs.task(max_attempts=2)
+def explode():
+    raise ValueError('Сбой задачи')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_key_deduplicates_queued_jobs(self):
+        """Задача с тем же ключом не ставится, пока первая ждет"""
+        self.assertIsNotNone(jobs.enqueue(record, key='once', value=1))
+        self.assertIsNone(jobs.enqueue(record, key='once', value=2))
+        jobs.run_pending()
+        self.assertEqual(calls, [1])
+        self.assertIsNotNone(jobs.enqueue(record, key='once', value=3))
+
+    def test_batch_task_gets_all_payloads(self):
+        """Пакетная задача вызывается один раз со всеми параметрами"""
+        for value in (3, 1, 2):
+            jobs.enqueue(record_batch, value=value)
+        self.assertEqual(jobs.run_pending(), 3)
+        self.assertEqual(calls, [[1, 2, 3]])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        """Упавшая задача откладывается, а после лимита попыток - ошибка"""
+        job = jobs.enqueue(explode)
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(jobs.run_pending(), 0)
+
+        Job.objects.update(run_after=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('Сбой задачи', job.last_error)
+
+    def test_run_jobs_command(self):
+        """Команда run_jobs --once выполняет очередь и завершается"""
+        jobs.enqueue(record, value='command')
+        call_command('run_jobs', '--once', '--workers=0', stdout=StringIO())
+        self.assertEqual(calls, ['command'])
+
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(STATIC_ROOT=TEMP_STATIC_ROOT)
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def test_hashed_file_is_immutable_and_compressed(self):
+        """Файл с хешем отдается сжатым и с вечным кэшированием"""
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertNotEqual(url, '/static/css/bootstrap.min.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertTrue(body.startswith(b'@charset'))
+
+    def test_unhashed_file_is_revalidated(self):
+        """Файл без хеша кэшируется ненадолго и не сжимается без запроса"""
+        response = self.client.get('/static/css/bootstrap.min.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response = self.client.get(
+            '/static/css/bootstrap.min.css',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_pages_do_not_use_cdn(self):
+        """Страницы подключают только локальную статику"""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'cdn.jsdelivr.net')
+        self.assertContains(
+            response, staticfiles_storage.url('css/bootstrap.min.css')
+        )
+
+
+class HtmlSizeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Пост {i}') for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_collapse_whitespace(self):
+        """Отступы, пустые строки и строки-теги не попадают в вывод"""
+        source = (
+            '<p>\n'
+            '    {% if x %}\n'
+            '\n'
+            '    Текст {{ x }}\n'
+            '    {% endif %}\n'
+            '</p>\n'
+        )
+        self.assertEqual(
+            collapse_whitespace(source),
+            '<p>\n{% if x %}Текст {{ x }}\n{% endif %}</p>\n',
+        )
+
+    def test_icons_come_from_sprite(self):
+        """Иконки карточек ссылаются на один спрайт"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<symbol id="i-heart"', count=1)
+        self.assertContains(response, '<use href="#i-heart">', count=5)
+
+    def test_listing_is_gzipped(self):
+        """Страница ленты сжимается для клиентов с gzip"""
+        response = self.client.get(
+            reverse('posts:index'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(
+            'Пост 0'.encode(), gzip.decompress(response.content)
+        )
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_are_applied(self):
+        """Новое соединение получает настройки из SQLITE_PRAGMAS"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout']
+            )
+
+    @override_settings(SQLITE_RETRY_DELAY=0)
+    def test_locked_write_is_retried(self):
+        """Пишущий запрос повторяется после «database is locked»"""
+        attempts = []
+
+        def view(request):
+            attempts.append(request)
+            if len(attempts) < 2:
+                raise OperationalError('database is locked')
+            return HttpResponse('ok')
+
+        middleware = SQLiteWriteRetryMiddleware(lambda request: None)
+        request = RequestFactory().post('/')
+        with self.assertLogs('core.middleware', 'WARNING'):
+            response = middleware.process_view(request, view, (), {})
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(len(attempts), 2)
+        self.assertIsNone(
+            middleware.process_view(RequestFactory().get('/'), view, (), {})
+        )
+
+    @override_settings(SQLITE_RETRY_DELAY=0, SQLITE_WRITE_RETRIES=1)
+    def test_other_errors_are_not_retried(self):
+        """Прочие ошибки и исчерпанные попытки пробрасываются дальше"""
+        def view(request):
+            raise OperationalError('no such table')
+
+        middleware = SQLiteWriteRetryMiddleware(lambda request: None)
+        with self.assertRaises(OperationalError):
+            middleware.process_view(RequestFactory().post('/'), view, (), {})
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def read_database(self):
+        return self.router.db_for_read(Post)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_goes_to_default(self):
+        """Без реплик чтение идет в основную базу"""
+        self.assertEqual(self.read_database(), 'default')
+
+    @override_settings(DATABASE_REPLICA_BALANCING='round_robin')
+    def test_reads_are_balanced_and_writes_go_to_primary(self):
+        """Чтение распределяется по репликам, запись - в основную базу"""
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            reads = [self.read_database() for _ in range(4)]
+        self.assertEqual(reads, ['replica1', 'replica2'] * 2)
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+    def test_transaction_reads_from_primary(self):
+        """Внутри транзакции чтение идет в основную базу"""
+        self.assertTrue(connection.in_atomic_block)
+        self.assertEqual(self.read_database(), 'default')
+
+    def test_user_reads_own_writes(self):
+        """После записи пользователь читает из основной базы"""
+        def view(request):
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                return HttpResponse(self.read_database())
+
+        middleware = ReadYourWritesMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.content, b'default')
+        cookie = response.cookies[PRIMARY_COOKIE]
+
+        request = factory.get('/')
+        request.COOKIES[PRIMARY_COOKIE] = cookie.value
+        self.assertEqual(middleware(request).content, b'default')
+        self.assertIn(
+            middleware(factory.get('/')).content, (b'replica1', b'replica2')
+        )
+
+
+class QueryBudgetTests(TestCase):
+    def run_view(self, view):
+        def get_response(request):
+            request.resolver_match = resolve(reverse('posts:index'))
+            view()
+            return HttpResponse()
+
+        QueryBudgetMiddleware(get_response)(RequestFactory().get('/'))
+
+    def test_in_lists_share_shape(self):
+        """Списки IN разной длины дают одну форму запроса"""
+        self.assertEqual(
+            query_shape('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            query_shape('SELECT 1 WHERE id IN (%s)'),
+        )
+
+    def test_repeated_queries_are_logged(self):
+        """Повторы одной формы запроса попадают в лог как N+1"""
+        before = view_stats.snapshot().get('posts:index', {'queries': 0})
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.run_view(lambda: [
+                Post.objects.filter(pk=pk).exists() for pk in range(6)
+            ])
+        self.assertIn('N+1', logs.output[0])
+        after = view_stats.snapshot()['posts:index']
+        self.assertEqual(after['queries'] - before['queries'], 6)
+
+    def test_repeated_writes_are_not_logged(self):
+        """Повторы записей и редкие повторы SELECT не считаются N+1"""
+        with record_queries() as recorder:
+            for pk in range(2):
+                Post.objects.filter(pk=pk).exists()
+                Post.objects.filter(pk=pk).update(text='')
+        self.assertEqual(recorder.repeated(), {})
+        self.assertEqual(len(recorder.repeated(limit=1)), 1)
+
+    @override_settings(QUERY_BUDGETS={'posts:index': 1})
+    def test_budget_overrun_is_logged(self):
+        """Превышение бюджета view попадает в лог"""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.run_view(
+                lambda: (Post.objects.exists(), User.objects.exists())
+            )
+        self.assertIn('бюджете 1', logs.output[0])
+
+
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR, METRICS_FLUSH_INTERVAL=0)
+class MetricsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cache_key_prefix(self):
+        """Префикс ключа кэша не содержит хешей и номеров"""
+        self.assertEqual(
+            metrics.cache_key_prefix('post_card:12:0:9f86d081884c7d65'),
+            'post_card'
+        )
+        self.assertEqual(
+            metrics.cache_key_prefix(
+                'views.decorators.cache.cache_page.listing.'
+                '9f86d081884c7d659a2feaa0c55ad015.1700000000.GET.abc'
+            ),
+            'views.decorators.cache.cache_page.listing'
+        )
+
+    def test_metrics_endpoint(self):
+        """/metrics отдает гистограммы по view и счетчики кэша"""
+        client = Client()
+        client.get(reverse('posts:index'))
+        client.get(reverse('posts:index'))
+        client.force_login(
+            User.objects.create_user(username='staff', is_staff=True)
+        )
+        text = client.get(reverse('metrics')).content.decode()
+        for line in (
+            '# TYPE yatube_request_duration_seconds histogram',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}',
+            'yatube_response_size_bytes_count{view="posts:index"}',
+            'yatube_db_duration_seconds_count{view="posts:index"}',
+            'yatube_template_render_seconds_count'
+            '{template="posts/index.html"}',
+            'yatube_cache_requests_total{prefix="views.decorators.cache.'
+            'cache_header.listing",result="hit"}',
+            'yatube_cache_requests_total{prefix="views.decorators.cache.'
+            'cache_header.listing",result="miss"}',
+        ):
+            self.assertIn(line, text)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_require_staff_or_token(self):
+        """/metrics закрыт для гостей и обычных пользователей"""
+        url = reverse('metrics')
+        user_client = Client()
+        user_client.force_login(User.objects.create_user(username='user'))
+        self.assertEqual(Client().get(url).status_code, 403)
+        self.assertEqual(user_client.get(url).status_code, 403)
+        self.assertEqual(
+            Client().get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code,
+            403
+        )
+        self.assertEqual(
+            Client().get(url, HTTP_AUTHORIZATION='Bearer secret').status_code,
+            200
+        )
+
+    def test_finished_processes_are_archived(self):
+        """Файлы завершившихся процессов сворачиваются в архив"""
+        labels = {'prefix': 'archived', 'result': 'hit'}
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        own_file = metrics._process_file_name(finished.pid)
+        # Тот же PID на другой машине с общим каталогом: не наш процесс.
+        other_host_file = f'other.{own_file}'
+        for file_name in (own_file, other_host_file, 'archive.json'):
+            with open(f'{TEMP_METRICS_DIR}/{file_name}', 'w') as old_file:
+                json.dump({
+                    'counters': [['yatube_cache_requests', labels, 2]],
+                    'histograms': [],
+                }, old_file)
+        line = 'yatube_cache_requests_total{prefix="archived",result="hit"}'
+        self.assertIn(f'{line} 6', metrics.render())
+        self.assertFalse(os.path.exists(f'{TEMP_METRICS_DIR}/{own_file}'))
+        self.assertTrue(
+            os.path.exists(f'{TEMP_METRICS_DIR}/{other_host_file}')
+        )
+        self.assertIn(f'{line} 6', metrics.render())
+
+    def test_metrics_are_summed_across_processes(self):
+        """Счетчики всех процессов складываются"""
+        labels = {'prefix': 'test', 'result': 'hit'}
+        metrics.CACHE_REQUESTS.inc(2, **labels)
+        other_file = metrics._process_file_name(os.getppid())
+        with open(f'{TEMP_METRICS_DIR}/{other_file}', 'w') as other_process:
+            json.dump({
+                'counters': [['yatube_cache_requests', labels, 3]],
+                'histograms': [],
+            }, other_process)
+        own = metrics._counters[
+            ('yatube_cache_requests', tuple(sorted(labels.items())))
+        ]
+        self.assertIn(
+            'yatube_cache_requests_total{prefix="test",result="hit"} '
+            f'{own + 3}',
+            metrics.render()
+        )
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description=''
+        )
+        post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Котики и собаки'
+        )
+        post.tags.add('cats')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_benchmark_reports_and_compares(self):
+        """Прогон сохраняет JSON и сравнивается с базовым"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = f'{directory}/baseline.json'
+            options = dict(
+                requests=3, concurrency=1, warmup=1, stdout=StringIO(),
+                stderr=StringIO(),
+                only=['posts:index', 'posts:index+cold',
+                      'posts:follow_index', 'users:login'],
+            )
+            sessions = Session.objects.count()
+            call_command('benchmark', output=output, **options)
+            self.assertEqual(Session.objects.count(), sessions)
+            with open(output) as result_file:
+                results = json.load(result_file)
+            stdout = StringIO()
+            call_command(
+                'benchmark', baseline=output, **dict(options, stdout=stdout)
+            )
+        self.assertEqual(set(results['scenarios']), set(options['only']))
+        follow = results['scenarios']['posts:follow_index']
+        self.assertEqual(follow['statuses'], [200])
+        self.assertGreater(follow['queries_per_request'], 0)
+        scenarios = results['scenarios']
+        self.assertEqual(scenarios['posts:index']['queries_per_request'], 0)
+        self.assertGreater(
+            scenarios['posts:index+cold']['queries_per_request'], 0
+        )
+        self.assertLessEqual(follow['p50_ms'], follow['p99_ms'])
+        self.assertGreater(results['peak_rss_mb'], 0)
+        self.assertIn('posts:follow_index: p95', stdout.getvalue())
+
+    def test_compare_flags_regressions(self):
+        """Рост p95 больше порога считается регрессией"""
+        def run(p95, throughput):
+            return {'scenarios': {'posts:index': {
+                'p95_ms': p95, 'throughput': throughput,
+                'queries_per_request': 3,
+            }}}
+
+        _, regressions = benchmark.compare(run(12, 100), run(10, 100), 0.1)
+        self.assertEqual(regressions, ['posts:index'])
+        _, regressions = benchmark.compare(run(10.5, 98), run(10, 100), 0.1)
+        self.assertEqual(regressions, [])
@@ -0,0 +1,144 @@
+"""Заблаговременная нарезка адаптивных версий картинок.
+
+Для каждого набора из settings.THUMBNAIL_PRESETS картинка сразу после
+загрузки нарезается фоновой задачей (core.jobs) в несколько ширин, в WebP
+и в JPEG для браузеров без WebP. Версии хранятся рядом с оригиналом
+(posts/cat.jpg -> posts/cat.card-640.webp), поэтому шаблоны строят
+srcset по имени файла и никогда не масштабируют картинку в потоке
+обработки запроса.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import jobs
+
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+)
+
+
+def get_rendition(rendition):
+    """Параметры версии по ее имени ('card', 'avatar', ...)."""
+    for renditions in settings.THUMBNAIL_PRESETS.values():
+        if rendition in renditions:
+            return renditions[rendition]
+    raise KeyError(rendition)
+
+
+def rendition_name(name, rendition, width, extension):
+    root, _ = os.path.splitext(name)
+    return f'{root}.{rendition}-{width}.{extension}'
+
+
+def _ready_key(name, rendition):
+    digest = hashlib.md5(name.encode()).hexdigest()
+    return f'rendition_ready:{digest}:{rendition}'
+
+
+def renditions_ready(field_file, rendition):
+    """Нарезаны ли версии rendition файла.
+
+    Готовность запоминается в кэше, чтобы не проверять файл в хранилище
+    при каждой отрисовке; generate() и delete() обновляют отметку.
+    """
+    key = _ready_key(field_file.name, rendition)
+    if cache.get(key):
+        return True
+    options = get_rendition(rendition)
+    fallback = rendition_name(
+        field_file.name, rendition, options['widths'][-1], FORMATS[-1][0]
+    )
+    if not field_file.storage.exists(fallback):
+        return False
+    cache.set(key, True, None)
+    return True
+
+
+def rendition_height(options, width):
+    box_width, box_height = options['size']
+    return round(width * box_height / box_width)
+
+
+def _flatten(image):
+    """Поворачивает по EXIF и кладет прозрачные картинки на белый фон."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _resize(image, options, width):
+    if options['crop']:
+        return ImageOps.fit(
+            image, (width, rendition_height(options, width)), Image.LANCZOS
+        )
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _save(storage, name, image, image_format, save_options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **save_options)
+    content = ContentFile(buffer.getvalue())
+    if hasattr(storage, 'save_derived'):
+        storage.save_derived(name, content)
+        return
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, content)
+
+
+def generate(name, storage, preset):
+    """Нарезает все версии набора preset для файла name."""
+    with storage.open(name) as source:
+        image = _flatten(Image.open(source))
+    for rendition, options in settings.THUMBNAIL_PRESETS[preset].items():
+        for width in options['widths']:
+            resized = _resize(image, options, width)
+            for extension, image_format, save_options in FORMATS:
+                _save(
+                    storage,
+                    rendition_name(name, rendition, width, extension),
+                    resized,
+                    image_format,
+                    save_options,
+                )
+        cache.set(_ready_key(name, rendition), True, None)
+
+
+def delete(name, storage, preset):
+    """Удаляет все версии файла name."""
+    for rendition, options in settings.THUMBNAIL_PRESETS[preset].items():
+        cache.delete(_ready_key(name, rendition))
+        for width in options['widths']:
+            for extension, _, _ in FORMATS:
+                storage.delete(
+                    rendition_name(name, rendition, width, extension)
+                )
+
+
+@jobs.task()
+def generate_job(name, preset):
+    generate(name, default_storage, preset)
+
+
+def schedule(field_file, preset):
+    """Ставит нарезку версий файла в очередь фоновых задач."""
+    if field_file:
+        jobs.enqueue(
+            generate_job,
+            key=f'thumbnails:{field_file.name}',
+            name=field_file.name,
+            preset=preset,
+        )
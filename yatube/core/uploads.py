@@ -0,0 +1,121 @@
+"""Прием загружаемых картинок с ограниченным расходом памяти.
+
+Загрузка проходит несколько ступеней: обработчик загрузки перестает
+принимать файл после IMAGE_UPLOAD_MAX_SIZE байт, поле формы проверяет
+число пикселей по заголовку еще до декодирования, затем картинка
+декодируется в черновом режиме сразу в уменьшенном виде, поворачивается
+по EXIF и пересохраняется без метаданных. В хранилище попадает только
+нормализованный файл.
+"""
+import os
+from io import BytesIO
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'GIF': {},
+    'WEBP': {'quality': 90},
+}
+FALLBACK_FORMAT = 'PNG'
+METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Не пропускает дальше по цепочке файлы больше лимита.
+
+    Ставится первым в FILE_UPLOAD_HANDLERS. Как только файл превысил
+    IMAGE_UPLOAD_MAX_SIZE, остаток пропускается, а вместо файла форма
+    получает пустую заглушку с пометкой oversized.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.oversized = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.oversized:
+            return None
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.oversized = True
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not self.oversized:
+            return None
+        upload = InMemoryUploadedFile(
+            BytesIO(),
+            self.field_name,
+            self.file_name,
+            self.content_type,
+            self.received,
+            self.charset,
+            self.content_type_extra,
+        )
+        upload.oversized = True
+        return upload
+
+
+def normalize(upload):
+    """Уменьшает картинку до IMAGE_MAX_DIMENSION и убирает метаданные."""
+    max_size = (settings.IMAGE_MAX_DIMENSION, settings.IMAGE_MAX_DIMENSION)
+    upload.seek(0)
+    with Image.open(upload) as source:
+        image_format = source.format
+        source.draft(source.mode, max_size)
+        image = ImageOps.exif_transpose(source)
+    image.thumbnail(max_size, Image.LANCZOS)
+    for key in METADATA_KEYS:
+        image.info.pop(key, None)
+
+    name = upload.name
+    if image_format not in SAVE_OPTIONS:
+        image_format = FALLBACK_FORMAT
+        name = os.path.splitext(name)[0] + '.png'
+    buffer = BytesIO()
+    image.save(buffer, image_format, **SAVE_OPTIONS[image_format])
+    return InMemoryUploadedFile(
+        buffer,
+        upload.field_name,
+        name,
+        Image.MIME[image_format],
+        buffer.tell(),
+        None,
+    )
+
+
+class BoundedImageField(forms.ImageField):
+    """ImageField, который сохраняет только нормализованную картинку."""
+
+    default_error_messages = {
+        'too_large': 'Файл больше %(limit)s МБ.',
+        'too_many_pixels': 'Картинка больше %(limit)s мегапикселей.',
+    }
+
+    def to_python(self, data):
+        if getattr(data, 'oversized', False):
+            raise ValidationError(
+                self.error_messages['too_large'],
+                code='too_large',
+                params={'limit': settings.IMAGE_UPLOAD_MAX_SIZE // 2 ** 20},
+            )
+        upload = super().to_python(data)
+        if upload is None:
+            return None
+        width, height = upload.image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                self.error_messages['too_many_pixels'],
+                code='too_many_pixels',
+                params={'limit': settings.IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        return normalize(upload)
@@ -9,6 +9,8 @@ class PostAdmin(admin.ModelAdmin):
         'pub_date',
         'author',
         'group',
+        'likes_count',
+        'comments_count',
     )
     list_editable = ('group',)
     search_fields = ('text',)
@@ -0,0 +1,43 @@
+"""Валидаторы для условных GET-запросов страницы поста.
+
+Версия поста - это время его правки, время последнего лайка или
+комментария (Post.last_activity), поколение ленты автора (его имя,
+фото и число постов) и зритель. Все это читается одним запросом по
+первичному ключу, поэтому на повторный запрос с If-None-Match
+страница отвечает 304, не выполняя запросов для шаблона.
+
+Last-Modified не отдается: время поста не зависит от зрителя, и
+браузер с одним If-Modified-Since получал бы 304 и старую страницу
+после входа, выхода или лайка.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from . import generations
+from .models import Post
+
+
+def _post_version(request, post_id):
+    if not hasattr(request, '_post_version'):
+        request._post_version = Post.objects.filter(pk=post_id).order_by(
+        ).values_list('updated', 'last_activity', 'author__username').first()
+    return request._post_version
+
+
+def post_etag(request, post_id):
+    version = _post_version(request, post_id)
+    if version is None:
+        return None
+    updated, last_activity, username = version
+    viewer = request.user.pk if request.user.is_authenticated else ''
+    digest = hashlib.md5('{}:{}:{}:{}'.format(
+        updated.isoformat(),
+        last_activity.isoformat() if last_activity else '',
+        generations.get_generation(generations.author_scope(username)),
+        viewer,
+    ).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+post_condition = condition(etag_func=post_etag)
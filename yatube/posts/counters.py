@@ -0,0 +1,129 @@
+"""Денормализованные счетчики постов, групп и статистики авторов.
+
+Запись сдвигает счетчик сразу, а фоновая задача сверки позже
+пересчитывает его по фактическим данным и исправляет расхождения.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest, Now
+
+from core import jobs
+
+POST_COUNTERS = {
+    'likes_count': ('Like', 'post'),
+    'comments_count': ('Comment', 'post'),
+}
+GROUP_COUNTERS = {
+    'posts_count': ('Post', 'group'),
+}
+AUTHOR_COUNTERS = {
+    'posts_count': ('Post', 'author'),
+    'comments_count': ('Comment', 'author'),
+}
+
+
+def _change(queryset, field, delta, **extra):
+    queryset.update(**{field: Greatest(F(field) + delta, 0)}, **extra)
+
+
+def change(post_id, field, delta):
+    """Атомарно сдвигает счетчик поста на delta, не опуская ниже нуля.
+
+    Тем же UPDATE отмечается время последней активности поста, по
+    которому строятся валидаторы страницы поста.
+    """
+    from .models import Post
+
+    _change(
+        Post.objects.filter(pk=post_id), field, delta, last_activity=Now()
+    )
+
+
+def change_group(group_id, field, delta):
+    """То же для группы."""
+    from .models import Group
+
+    _change(Group.objects.filter(pk=group_id), field, delta)
+
+
+def change_author(user_id, field, delta):
+    """То же для статистики автора."""
+    from .models import AuthorStats
+
+    _change(AuthorStats.objects.filter(user_id=user_id), field, delta)
+
+
+def _recount(queryset, counters):
+    """Пересчитывает счетчики queryset по фактическим данным.
+
+    Модели передаются через apps-реестр, чтобы функцию можно было
+    вызывать и из миграций.
+    """
+    apps = queryset.model._meta.apps
+    updates = {}
+    for field, (model_name, relation) in counters.items():
+        model = apps.get_model('posts', model_name)
+        updates[field] = Coalesce(
+            Subquery(
+                model.objects.filter(**{relation: OuterRef('pk')})
+                .order_by()
+                .values(relation)
+                .annotate(total=Count('pk'))
+                .values('total')
+            ),
+            Value(0)
+        )
+    return queryset.update(**updates)
+
+
+def recount(posts):
+    return _recount(posts, POST_COUNTERS)
+
+
+def recount_groups(groups):
+    return _recount(groups, GROUP_COUNTERS)
+
+
+def recount_authors(stats):
+    return _recount(stats, AUTHOR_COUNTERS)
+
+
+@jobs.task(batch=True)
+def reconcile_posts(payloads):
+    from .models import Post
+
+    recount(Post.objects.filter(pk__in={p['post_id'] for p in payloads}))
+
+
+@jobs.task(batch=True)
+def reconcile_authors(payloads):
+    from .models import AuthorStats
+
+    recount_authors(AuthorStats.objects.filter(
+        user_id__in={p['user_id'] for p in payloads}
+    ))
+
+
+def schedule_reconcile(post_id=None, user_id=None):
+    """Ставит сверку счетчиков поста и автора в очередь.
+
+    Задача откладывается на COUNTERS_RECONCILE_DELAY секунд, и пока она
+    ждет, повторные изменения того же поста в очередь не попадают.
+    """
+    delay = timedelta(seconds=settings.COUNTERS_RECONCILE_DELAY)
+    if post_id:
+        jobs.enqueue(
+            reconcile_posts,
+            key=f'counters:post:{post_id}',
+            delay=delay,
+            post_id=post_id,
+        )
+    if user_id:
+        jobs.enqueue(
+            reconcile_authors,
+            key=f'counters:author:{user_id}',
+            delay=delay,
+            user_id=user_id,
+        )
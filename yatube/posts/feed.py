@@ -0,0 +1,87 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Каждый новый пост раскладывается по лентам подписчиков автора,
+поэтому страница подписок читает готовый индексированный срез
+вместо соединения Post -> User -> Follow.
+"""
+from django.conf import settings
+
+from core import jobs
+
+from .models import FeedItem, Follow, Post
+
+
+def _feed_items(user_ids, posts):
+    return [
+        FeedItem(
+            user_id=user_id,
+            post_id=post.id,
+            author_id=post.author_id,
+            pub_date=post.pub_date,
+        )
+        for user_id in user_ids
+        for post in posts
+    ]
+
+
+def fan_out_post(post):
+    """Добавляет пост в ленты всех подписчиков автора.
+
+    Посты авторов с большим числом подписчиков раскладываются фоновой
+    задачей, чтобы публикация не ждала тысяч вставок.
+    """
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    if followers.count() > settings.FEED_INLINE_FOLLOWERS:
+        jobs.enqueue(fan_out_job, key=f'feed:{post.pk}', post_id=post.pk)
+        return
+    FeedItem.objects.bulk_create(
+        _feed_items(followers.iterator(), [post]),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+@jobs.task()
+def fan_out_job(post_id):
+    post = Post.objects.filter(pk=post_id).only(
+        'id', 'author_id', 'pub_date'
+    ).first()
+    if post is None:
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedItem.objects.bulk_create(
+        _feed_items(followers.iterator(), [post]),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def add_author_to_feed(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    posts = Post.objects.filter(author_id=author_id).only(
+        'id', 'author_id', 'pub_date'
+    )[:settings.FEED_BACKFILL_SIZE]
+    FeedItem.objects.bulk_create(
+        _feed_items([user_id], posts),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def remove_author_from_feed(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    FeedItem.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild_feeds():
+    """Заполняет ленты по всем существующим подпискам."""
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    total = 0
+    for user_id, author_id in follows.iterator():
+        add_author_to_feed(user_id, author_id)
+        total += 1
+    return total
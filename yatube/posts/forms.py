@@ -1,5 +1,7 @@
 from django import forms
 
+from core.uploads import BoundedImageField
+
 from .models import Comment, Post
 
 
@@ -7,6 +9,7 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'tags', 'group', 'image')
+        field_classes = {'image': BoundedImageField}
 
 
 class CommentForm(forms.ModelForm):
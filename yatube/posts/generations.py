@@ -0,0 +1,152 @@
+"""Поколенческий кэш лент постов.
+
+У каждой ленты есть область (scope): общая лента, тег, группа или автор.
+Номер поколения области входит в ключ кэша страницы, поэтому запись
+поста инвалидирует только затронутые ленты простым инкрементом
+счетчика, а сами страницы можно хранить минутами.
+
+Поколения и страницы лежат в кэше default. Чтобы инкремент в одном
+процессе видели остальные, при нескольких воркерах нужен общий кэш
+(MEMCACHED_LOCATION в settings); с LocMemCache по умолчанию
+поддерживается только один процесс.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition
+
+from core.routers import use_primary
+
+ALL_POSTS = 'posts'
+
+
+def tag_scope(slug):
+    return f'tag:{slug}'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def _generation_key(scope):
+    digest = hashlib.md5(scope.encode()).hexdigest()
+    return f'generation:{digest}'
+
+
+def _initial_generation():
+    # Отсчет от текущего времени: если ключ вытеснят из кэша, новое
+    # поколение не совпадет ни с одним из прежних.
+    return time.time_ns() // 1000
+
+
+def get_generation(scope):
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bumped_key(scope):
+    return f'{_generation_key(scope)}:bumped'
+
+
+def bump(*scopes):
+    scopes = set(scopes)
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    if settings.DATABASE_REPLICAS:
+        # Реплика догоняет запись с задержкой: пока она могла отстать,
+        # страницы нового поколения читаются с основной базы.
+        cache.set_many(
+            {_bumped_key(scope): True for scope in scopes},
+            settings.READ_YOUR_WRITES_SECONDS,
+        )
+
+
+def recently_bumped(scope):
+    return bool(settings.DATABASE_REPLICAS and cache.get(_bumped_key(scope)))
+
+
+def post_scopes(post, tag_slugs=()):
+    """Области лент, в которых виден пост."""
+    scopes = [ALL_POSTS, author_scope(post.author.username)]
+    if post.group_id:
+        scopes.append(group_scope(post.group.slug))
+    scopes.extend(tag_scope(slug) for slug in tag_slugs)
+    return scopes
+
+
+def listing_etag(request, generation):
+    """Слабый ETag страницы ленты без запросов к базе.
+
+    Страница зависит от поколения области, от зрителя (меню, кнопка
+    подписки) и от счетчиков лайков, которые могут отставать на
+    LISTING_CACHE_TIMEOUT, поэтому в тег входит и номер этого интервала.
+    """
+    interval = int(time.time() // settings.LISTING_CACHE_TIMEOUT)
+    viewer = request.user.pk if request.user.is_authenticated else ''
+    digest = hashlib.md5(
+        f'{generation}:{interval}:{viewer}'.encode()
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def cache_listing(kind=None, kwarg=None):
+    """cache_page, ключ которого включает поколение области ленты.
+
+    Область берется из аргумента URL kwarg (например, slug группы);
+    без него страница относится к общей ленте. Тот же номер поколения
+    дает ETag, так что на повторный запрос с If-None-Match отвечаем
+    304, не заглядывая в кэш страниц и не рендеря шаблон.
+
+    В кэш страниц попадают только ответы гостям: у вошедшего
+    пользователя в странице его меню, кнопка подписки и CSRF-токен, а
+    cache_page срабатывает раньше, чем SessionMiddleware добавит
+    Vary: Cookie, и отдал бы такую страницу всем.
+
+    Первые READ_YOUR_WRITES_SECONDS после смены поколения страница
+    читается с основной базы, чтобы под новым ключом не закэшировать
+    данные отставшей реплики.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            value = kwargs.get(kwarg) if kwarg else None
+            scope = f'{kind}:{value}' if value else ALL_POSTS
+            generation = get_generation(scope)
+            key_prefix = 'listing.{}.{}'.format(
+                hashlib.md5(scope.encode()).hexdigest(), generation
+            )
+            etag = listing_etag(request, generation)
+            if not request.user.is_authenticated:
+                view_func = cache_page(
+                    settings.LISTING_CACHE_TIMEOUT, key_prefix=key_prefix
+                )(view)
+            else:
+                view_func = view
+            conditional_view = condition(
+                etag_func=lambda *args, **kwargs: etag
+            )(view_func)
+            if not recently_bumped(scope):
+                return conditional_view(request, *args, **kwargs)
+            token = use_primary.set(True)
+            try:
+                return conditional_view(request, *args, **kwargs)
+            finally:
+                use_primary.reset(token)
+        return wrapper
+    return decorator
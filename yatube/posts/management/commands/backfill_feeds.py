@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feed import rebuild_feeds
+from posts.models import FeedItem
+
+
+class Command(BaseCommand):
+    help = 'Заполняет материализованные ленты по существующим подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Предварительно очистить все ленты',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['clear']:
+                FeedItem.objects.all().delete()
+            total = rebuild_feeds()
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано подписок: {total}')
+        )
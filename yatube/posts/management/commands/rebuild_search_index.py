@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import is_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов'
+
+    def handle(self, *args, **options):
+        if not is_available():
+            raise CommandError(
+                'Полнотекстовый индекс доступен только в SQLite'
+            )
+        with transaction.atomic():
+            total = rebuild_index(Post.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {total}')
+        )
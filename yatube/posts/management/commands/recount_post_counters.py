@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount, recount_authors, recount_groups
+from posts.models import AuthorStats, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики лайков и комментариев постов, '
+        'число постов в группах и статистику авторов'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = recount(Post.objects.all())
+            groups = recount_groups(Group.objects.all())
+            missing = User.objects.filter(stats__isnull=True)
+            AuthorStats.objects.bulk_create(
+                [AuthorStats(user=user) for user in missing.only('pk')],
+                batch_size=500,
+            )
+            authors = recount_authors(AuthorStats.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано постов: {posts}, групп: {groups}, '
+            f'авторов: {authors}'
+        ))
@@ -0,0 +1,339 @@
+import itertools
+import random
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+from taggit.models import Tag, TaggedItem
+
+from posts import feed, generations, search
+from posts.models import Comment, Follow, Group, Like, Post, User
+from users.models import Profile
+
+TEXT_POOL_SIZE = 2000
+# Показатели степенного закона: чем меньше, тем сильнее перекос.
+POPULARITY_SHAPE = 1.1
+VIRALITY_SHAPE = 1.3
+GROUP_SHARE = 0.7
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Дает записать в поля auto_now/auto_now_add заданные даты."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class WeightedChoice:
+    """Выбор элементов с весами по бинарному поиску в накопленных весах."""
+
+    def __init__(self, rng, items, weights):
+        self.rng = rng
+        self.items = items
+        self.cumulative = list(itertools.accumulate(weights))
+        self.total = self.cumulative[-1]
+
+    def __call__(self):
+        return self.items[
+            bisect(self.cumulative, self.rng.random() * self.total)
+        ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'тегами, комментариями, лайками и подписками. Подписчики и лайки '
+        'распределены по степенному закону: немногие авторы собирают '
+        'большинство подписок, немногие посты - большинство лайков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=300)
+        parser.add_argument(
+            '--comments', type=float, default=2,
+            help='Комментариев на пост в среднем',
+        )
+        parser.add_argument(
+            '--likes', type=float, default=5,
+            help='Лайков на пост в среднем',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='Подписок на пользователя в среднем',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней публикуются посты',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=20000,
+            help='Сколько объектов вставлять в одной транзакции',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--skip-feeds',
+            action='store_true',
+            help='Не заполнять ленты подписок (долго на миллионах подписок)',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        self.texts = [fake.sentence() for _ in range(TEXT_POOL_SIZE)]
+
+        user_ids = self.create_users(fake, options)
+        group_ids = self.create_groups(fake, options['groups'])
+        tag_ids = self.create_tags(fake, options['tags'])
+        post_ids, post_dates = self.create_posts(
+            user_ids, group_ids, options['posts'], options['days']
+        )
+        self.create_tagged_items(post_ids, tag_ids)
+        self.create_follows(user_ids, options['follows'])
+        viral_post = WeightedChoice(
+            self.rng,
+            range(len(post_ids)),
+            [self.rng.paretovariate(VIRALITY_SHAPE) for _ in post_ids],
+        )
+        self.create_likes(user_ids, post_ids, viral_post, options['likes'])
+        self.create_comments(
+            user_ids, post_ids, post_dates, viral_post, options['comments']
+        )
+        self.rebuild_derived(post_ids, options['skip_feeds'])
+
+    def log(self, message):
+        self.stdout.write(message)
+        self.stdout.flush()
+
+    def insert(self, model, objects, ignore_conflicts=False):
+        """Вставляет объекты пачками по batch_size в отдельных транзакциях
+        и возвращает их число."""
+        total = 0
+        objects = iter(objects)
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return total
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts
+                )
+            total += len(batch)
+
+    def new_ids(self, model, last_id):
+        return list(
+            model.objects.filter(pk__gt=last_id)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+
+    def last_id(self, model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+
+    def create_users(self, fake, options):
+        last_id = self.last_id(User)
+        password = make_password(options['password'])
+        self.insert(User, (
+            User(
+                username=f'seed{last_id + number}',
+                first_name=fake.first_name(),
+                last_name=fake.last_name(),
+                password=password,
+                date_joined=self.now,
+            )
+            for number in range(1, options['users'] + 1)
+        ))
+        user_ids = self.new_ids(User, last_id)
+        self.insert(Profile, (Profile(user_id=pk) for pk in user_ids))
+        self.log(f'Пользователей: {len(user_ids)}')
+        return user_ids
+
+    def create_groups(self, fake, count):
+        last_id = self.last_id(Group)
+        self.insert(Group, (
+            Group(
+                title=fake.catch_phrase()[:200],
+                slug=f'seed-{last_id + number}',
+                description=fake.paragraph(),
+            )
+            for number in range(1, count + 1)
+        ))
+        group_ids = self.new_ids(Group, last_id)
+        self.log(f'Групп: {len(group_ids)}')
+        return group_ids
+
+    def create_tags(self, fake, count):
+        names = set()
+        for number in range(count):
+            # Словарь Faker невелик: повторы различаются номером.
+            word = fake.word()
+            names.add(word if word not in names else f'{word}{number}')
+        existing = set(
+            Tag.objects.filter(name__in=names).values_list('name', flat=True)
+        )
+        self.insert(Tag, (
+            Tag(name=name, slug=Tag().slugify(name))
+            for name in names - existing
+        ), ignore_conflicts=True)
+        tag_ids = list(
+            Tag.objects.filter(name__in=names).values_list('pk', flat=True)
+        )
+        self.log(f'Тегов: {len(tag_ids)}')
+        return tag_ids
+
+    def popularity(self, items):
+        """Выбор по степенному закону: каждый элемент получает
+        случайный вес из распределения Парето."""
+        return WeightedChoice(
+            self.rng,
+            items,
+            [self.rng.paretovariate(POPULARITY_SHAPE) for _ in items],
+        )
+
+    def create_posts(self, user_ids, group_ids, count, days):
+        author = self.popularity(user_ids)
+        group = self.popularity(group_ids) if group_ids else None
+        # Даты по возрастанию, чтобы id постов шли в порядке публикации.
+        dates = sorted(
+            self.now - timedelta(seconds=self.rng.uniform(0, days * 86400))
+            for _ in range(count)
+        )
+        last_id = self.last_id(Post)
+        fields = (
+            Post._meta.get_field('pub_date'), Post._meta.get_field('updated')
+        )
+        with explicit_dates(*fields):
+            self.insert(Post, (
+                Post(
+                    author_id=author(),
+                    group_id=(
+                        group() if group and self.rng.random() < GROUP_SHARE
+                        else None
+                    ),
+                    text=self.text(),
+                    pub_date=pub_date,
+                    updated=pub_date,
+                )
+                for pub_date in dates
+            ))
+        post_ids = self.new_ids(Post, last_id)
+        self.log(f'Постов: {len(post_ids)}')
+        return post_ids, dates
+
+    def text(self):
+        return ' '.join(self.rng.sample(self.texts, self.rng.randint(1, 6)))
+
+    def create_tagged_items(self, post_ids, tag_ids):
+        if not tag_ids:
+            return
+        content_type = ContentType.objects.get_for_model(Post)
+        tag = self.popularity(tag_ids)
+        total = self.insert(TaggedItem, (
+            TaggedItem(
+                content_type=content_type, object_id=post_id, tag_id=tag_id
+            )
+            for post_id in post_ids
+            for tag_id in {tag() for _ in range(self.rng.randint(0, 3))}
+        ))
+        self.log(f'Тегов у постов: {total}')
+
+    def create_follows(self, user_ids, per_user):
+        author = self.popularity(user_ids)
+
+        def follows():
+            for user_id in user_ids:
+                count = min(
+                    round(self.rng.expovariate(1 / per_user)),
+                    len(user_ids) - 1,
+                ) if per_user else 0
+                authors = set()
+                for _ in range(count * 2):
+                    if len(authors) >= count:
+                        break
+                    author_id = author()
+                    if author_id != user_id:
+                        authors.add(author_id)
+                for author_id in authors:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        total = self.insert(Follow, follows(), ignore_conflicts=True)
+        self.log(f'Подписок: {total}')
+
+    def create_likes(self, user_ids, post_ids, viral_post, per_post):
+        total = self.insert(Like, (
+            Like(
+                user_id=self.rng.choice(user_ids),
+                post_id=post_ids[viral_post()],
+            )
+            for _ in range(round(per_post * len(post_ids)))
+        ), ignore_conflicts=True)
+        self.log(f'Лайков (с повторами): {total}')
+
+    def create_comments(self, user_ids, post_ids, post_dates, viral_post,
+                        per_post):
+        def comments():
+            for _ in range(round(per_post * len(post_ids))):
+                index = viral_post()
+                created = min(
+                    post_dates[index]
+                    + timedelta(hours=self.rng.expovariate(1 / 24)),
+                    self.now,
+                )
+                yield Comment(
+                    post_id=post_ids[index],
+                    author_id=self.rng.choice(user_ids),
+                    text=self.text(),
+                    created=created,
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            total = self.insert(Comment, comments())
+        self.log(f'Комментариев: {total}')
+
+    def rebuild_derived(self, post_ids, skip_feeds):
+        """bulk_create не шлет сигналы, поэтому счетчики, поисковый
+        индекс и ленты строятся заново по итоговым данным, а кэш
+        затронутых лент сбрасывается сменой поколения."""
+        call_command('recount_post_counters', stdout=self.stdout)
+        if search.is_available():
+            search.rebuild_index(Post.objects.all())
+            self.log('Поисковый индекс перестроен')
+        if not skip_feeds:
+            with transaction.atomic():
+                total = feed.rebuild_feeds()
+            self.log(f'Лент заполнено по подпискам: {total}')
+        # Новые посты идут подряд после прежних, так что их авторов
+        # проще выбрать по границе id, чем передавать список в IN.
+        authors = User.objects.filter(
+            posts__pk__gte=post_ids[0]
+        ).values_list('username', flat=True).distinct() if post_ids else ()
+        generations.bump(
+            generations.ALL_POSTS,
+            *(generations.tag_scope(slug)
+              for slug in Tag.objects.values_list('slug', flat=True)),
+            *(generations.group_scope(slug)
+              for slug in Group.objects.values_list('slug', flat=True)),
+            *(generations.author_scope(username) for username in authors),
+        )
+        self.stdout.write(self.style.SUCCESS('Готово'))
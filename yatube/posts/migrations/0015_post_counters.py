@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 11:51
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _total(model, relation):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{relation: OuterRef('pk')})
+            .order_by()
+            .values(relation)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0)
+    )
+
+
+def fill_counters(apps, schema_editor):
+    apps.get_model('posts', 'Post').objects.update(
+        likes_count=_total(apps.get_model('posts', 'Like'), 'post'),
+        comments_count=_total(apps.get_model('posts', 'Comment'), 'post'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feeditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество лайков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
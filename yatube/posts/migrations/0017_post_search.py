@@ -0,0 +1,170 @@
+import re
+from datetime import timezone
+from functools import lru_cache
+
+from django.db import migrations
+
+# Копия стеммера из posts.search на момент миграции: изменения в
+# posts.search не должны менять то, что делает эта миграция.
+SEARCH_TABLE = 'posts_post_search'
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+
+def _regions(word):
+    """Границы областей RV и R2 алгоритма Snowball."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+@lru_cache(maxsize=None)
+def _endings(groups):
+    """Окончания обеих групп, от самых длинных к коротким."""
+    endings = [(ending, 0) for ending in groups[0]]
+    endings += [(ending, 1) for ending in groups[1]]
+    endings.sort(key=lambda item: len(item[0]), reverse=True)
+    return endings
+
+
+def _remove_ending(word, start, groups):
+    """Отрезает самое длинное окончание из groups в области word[start:].
+
+    Окончания первой группы допустимы только после «а» или «я».
+    """
+    for ending, group in _endings(groups):
+        if not word.endswith(ending):
+            continue
+        cut = len(word) - len(ending)
+        if cut < start:
+            return word, False
+        if group == 0 and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return word, False
+        return word[:cut], True
+    return word, False
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    word, found = _remove_ending(word, rv, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _remove_ending(word, rv, REFLEXIVE)
+        word, found = _remove_ending(word, rv, ADJECTIVE)
+        if found:
+            word, _ = _remove_ending(word, rv, PARTICIPLE)
+        else:
+            word, found = _remove_ending(word, rv, VERB)
+            if not found:
+                word, _ = _remove_ending(word, rv, NOUN)
+
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    word, _ = _remove_ending(word, r2, DERIVATIONAL)
+
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        word = word[:-1]
+    else:
+        word, found = _remove_ending(word, rv, SUPERLATIVE)
+        if found and word.endswith('нн') and len(word) - 1 >= rv:
+            word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
+
+
+def _document(text, pub_date):
+    return (
+        ' '.join(stem(word) for word in WORD_RE.findall(text)),
+        pub_date.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+        "stems, pub_date UNINDEXED, tokenize = 'unicode61')"
+    )
+    posts = apps.get_model('posts', 'Post').objects.values_list(
+        'id', 'text', 'pub_date'
+    )
+    insert = (
+        f'INSERT INTO {SEARCH_TABLE} (rowid, stems, pub_date) '
+        'VALUES (%s, %s, %s)'
+    )
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for post_id, text, pub_date in posts.iterator():
+            rows.append((post_id, *_document(text, pub_date)))
+            if len(rows) >= 1000:
+                cursor.executemany(insert, rows)
+                rows = []
+        cursor.executemany(insert, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 11:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _total(model, relation):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{relation: OuterRef('pk')})
+            .order_by()
+            .values(relation)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        Value(0)
+    )
+
+
+def fill_author_stats(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=pk) for pk in User.objects.values_list(
+            'pk', flat=True
+        )],
+        batch_size=500,
+    )
+    AuthorStats.objects.update(
+        posts_count=_total(apps.get_model('posts', 'Post'), 'author'),
+        comments_count=_total(apps.get_model('posts', 'Comment'), 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('posts', '0017_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='auth.user', verbose_name='Автор')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('comments_count', models.PositiveIntegerField(default=0, verbose_name='Количество комментариев')),
+            ],
+            options={
+                'verbose_name': 'Статистика автора',
+                'verbose_name_plural': 'Статистика авторов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(fields=['-posts_count', 'user'], name='stats_posts_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='authorstats',
+            index=models.Index(fields=['-comments_count', 'user'], name='stats_comments_count_idx'),
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
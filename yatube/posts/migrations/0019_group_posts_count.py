@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 11:57
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_posts_count(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    apps.get_model('posts', 'Group').objects.update(
+        posts_count=Coalesce(
+            Subquery(
+                Post.objects.filter(group=OuterRef('pk'))
+                .order_by()
+                .values('group')
+                .annotate(total=Count('pk'))
+                .values('total')
+            ),
+            Value(0)
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_authorstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество постов'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['title'], name='group_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-posts_count', 'title'], name='group_posts_count_idx'),
+        ),
+        migrations.RunPython(fill_posts_count, migrations.RunPython.noop),
+    ]
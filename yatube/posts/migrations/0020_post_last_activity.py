@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_group_posts_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний лайк или комментарий'),
+        ),
+    ]
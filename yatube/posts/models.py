@@ -1,6 +1,6 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import DatabaseError, models, router, transaction
 
 from taggit.managers import TaggableManager
 
@@ -12,6 +12,11 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=20, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
@@ -20,6 +25,37 @@ class Group(models.Model):
         verbose_name = 'Сообщество'
         verbose_name_plural = 'Сообщества'
         ordering = ('title',)
+        indexes = [
+            models.Index(fields=['title'], name='group_title_idx'),
+            models.Index(
+                fields=['-posts_count', 'title'],
+                name='group_posts_count_idx'
+            ),
+        ]
+
+
+class PostQuerySet(models.QuerySet):
+    CARD_DEFERRED_FIELDS = (
+        'author__password',
+        'author__last_login',
+        'author__is_superuser',
+        'author__is_staff',
+        'author__is_active',
+        'author__email',
+        'author__date_joined',
+        'author__profile__bio',
+        'author__profile__location',
+        'author__profile__birth_date',
+        'group__description',
+    )
+
+    def for_cards(self):
+        """Все, что нужно для отрисовки карточек, за постоянное число
+        запросов: автор с профилем и группа одним JOIN, теги одним
+        дополнительным запросом на всю страницу."""
+        return self.select_related(
+            'author__profile', 'group'
+        ).prefetch_related('tags').defer(*self.CARD_DEFERRED_FIELDS)
 
 
 class Post(models.Model):
@@ -31,6 +67,10 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -52,14 +92,81 @@ class Post(models.Model):
         blank=True
     )
     tags = TaggableManager(blank=True)
+    likes_count = models.PositiveIntegerField(
+        'Количество лайков',
+        default=0,
+        editable=False
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+    last_activity = models.DateTimeField(
+        'Последний лайк или комментарий',
+        null=True,
+        blank=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
+
+    # Эти поля меняют только атомарные UPDATE из posts.counters.
+    COUNTER_FIELDS = ('likes_count', 'comments_count', 'last_activity')
 
     def __str__(self):
         return self.text[:settings.POST_STRING_TITLE]
 
+    def save(self, *args, **kwargs):
+        """Сохранение существующего поста не записывает счетчики.
+
+        В памяти они могли устареть, и полный UPDATE затер бы лайки и
+        комментарии, добавленные после загрузки поста.
+
+        С update_fields Django не вставляет строку заново, если ее успели
+        удалить, а падает с DatabaseError. Этот случай превращается в
+        Post.DoesNotExist, как при чтении удаленного поста.
+        """
+        if (self._state.adding or kwargs.get('force_insert')
+                or kwargs.get('update_fields') is not None):
+            return super().save(*args, **kwargs)
+        skipped = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+        kwargs['update_fields'] = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in skipped
+        ]
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        try:
+            # Точка сохранения: после ошибки внешняя транзакция остается
+            # рабочей, и можно проверить, есть ли еще строка.
+            with transaction.atomic(using=using):
+                super().save(*args, **kwargs)
+        except DatabaseError:
+            if type(self)._base_manager.using(using).filter(
+                pk=self.pk
+            ).exists():
+                raise
+            raise self.DoesNotExist(
+                f'Пост {self.pk} удален до сохранения'
+            )
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['-pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -91,6 +198,12 @@ class Comment(models.Model):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -114,6 +227,12 @@ class Follow(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         unique_together = ['user', 'author']
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
 
 
 class Like(models.Model):
@@ -137,3 +256,82 @@ class Like(models.Model):
         verbose_name = 'Лайк'
         verbose_name_plural = 'Лайки'
         unique_together = ['user', 'post']
+        indexes = [
+            models.Index(fields=['post', 'user'], name='like_post_user_idx'),
+        ]
+
+
+class FeedItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    def __str__(self):
+        return f'{self.user} <- {self.post}'
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        ordering = ('-pub_date',)
+        unique_together = ['user', 'post']
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_post_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор',
+    )
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0
+    )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0
+    )
+
+    def __str__(self):
+        return f'{self.user}: {self.posts_count}/{self.comments_count}'
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+        indexes = [
+            models.Index(
+                fields=['-posts_count', 'user'],
+                name='stats_posts_count_idx'
+            ),
+            models.Index(
+                fields=['-comments_count', 'user'],
+                name='stats_comments_count_idx'
+            ),
+        ]
@@ -0,0 +1,254 @@
+"""Полнотекстовый поиск по постам.
+
+Тексты постов приводятся к основам слов русским стеммером Snowball
+и хранятся в виртуальной таблице SQLite FTS5, которая синхронизируется
+сигналами при сохранении и удалении постов. Выдача ранжируется по
+релевантности (bm25) с поправкой на свежесть поста.
+"""
+import re
+from datetime import timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Post
+
+SEARCH_TABLE = 'posts_post_search'
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'\w+')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+     'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+     'ая', 'яя', 'ою', 'ею'),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = (
+    (),
+    ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+     'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+     'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+     'ья', 'я'),
+)
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+STEM_CACHE_SIZE = 100000
+
+
+def _regions(word):
+    """Границы областей RV и R2 алгоритма Snowball."""
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+@lru_cache(maxsize=None)
+def _endings(groups):
+    """Окончания обеих групп, от самых длинных к коротким."""
+    endings = [(ending, 0) for ending in groups[0]]
+    endings += [(ending, 1) for ending in groups[1]]
+    endings.sort(key=lambda item: len(item[0]), reverse=True)
+    return endings
+
+
+def _remove_ending(word, start, groups):
+    """Отрезает самое длинное окончание из groups в области word[start:].
+
+    Окончания первой группы допустимы только после «а» или «я».
+    """
+    for ending, group in _endings(groups):
+        if not word.endswith(ending):
+            continue
+        cut = len(word) - len(ending)
+        if cut < start:
+            return word, False
+        if group == 0 and (cut - 1 < start or word[cut - 1] not in 'ая'):
+            return word, False
+        return word[:cut], True
+    return word, False
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    word, found = _remove_ending(word, rv, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _remove_ending(word, rv, REFLEXIVE)
+        word, found = _remove_ending(word, rv, ADJECTIVE)
+        if found:
+            word, _ = _remove_ending(word, rv, PARTICIPLE)
+        else:
+            word, found = _remove_ending(word, rv, VERB)
+            if not found:
+                word, _ = _remove_ending(word, rv, NOUN)
+
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    word, _ = _remove_ending(word, r2, DERIVATIONAL)
+
+    if word.endswith('нн') and len(word) - 1 >= rv:
+        word = word[:-1]
+    else:
+        word, found = _remove_ending(word, rv, SUPERLATIVE)
+        if found and word.endswith('нн') and len(word) - 1 >= rv:
+            word = word[:-1]
+        elif word.endswith('ь') and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
+
+
+def stems(text):
+    return [stem(word) for word in WORD_RE.findall(text)]
+
+
+def _document(text, pub_date):
+    return (
+        ' '.join(stems(text)),
+        pub_date.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+    )
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def index_post(post):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, stems, pub_date) '
+            'VALUES (%s, %s, %s)',
+            [post.pk, *_document(post.text, post.pub_date)],
+        )
+
+
+def unindex_post(post_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post_id]
+        )
+
+
+def rebuild_index(posts, batch_size=1000):
+    """Перестраивает индекс по queryset постов, возвращает их число."""
+    insert = (
+        f'INSERT INTO {SEARCH_TABLE} (rowid, stems, pub_date) '
+        'VALUES (%s, %s, %s)'
+    )
+    total = 0
+    rows = []
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        for post_id, text, pub_date in posts.values_list(
+            'id', 'text', 'pub_date'
+        ).iterator():
+            rows.append((post_id, *_document(text, pub_date)))
+            if len(rows) >= batch_size:
+                cursor.executemany(insert, rows)
+                total += len(rows)
+                rows = []
+        cursor.executemany(insert, rows)
+    return total + len(rows)
+
+
+def build_match(query):
+    """FTS5-запрос: все основы слов запроса, каждая как префикс."""
+    return ' '.join(f'"{word}"*' for word in stems(query))
+
+
+class SearchResults:
+    """Ленивая выдача поиска, пригодная для Paginator.
+
+    count() и срезы выполняются в индексе FTS5, посты подгружаются
+    только для запрошенной страницы.
+    """
+
+    def __init__(self, query):
+        self.match = build_match(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s',
+                [self.match],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        if not self.match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s '
+                f'ORDER BY bm25({SEARCH_TABLE}) / (1 + '
+                "(julianday('now') - julianday(pub_date)) / %s) "
+                'LIMIT %s OFFSET %s',
+                [
+                    self.match,
+                    settings.SEARCH_RECENCY_DAYS,
+                    key.stop - key.start,
+                    key.start,
+                ],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_cards().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def search_posts(query):
+    query = query.strip()
+    if is_available():
+        return SearchResults(query)
+    if not query:
+        return Post.objects.none()
+    return Post.objects.for_cards().filter(text__icontains=query)
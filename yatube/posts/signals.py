@@ -0,0 +1,178 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from taggit.models import Tag
+
+from core import media
+from users.models import Profile
+
+from . import counters, feed, generations, search
+from .models import AuthorStats, Comment, Follow, Like, Post, User
+
+
+def _tag_slugs(post):
+    return list(post.tags.values_list('slug', flat=True))
+
+
+media.track(Post, 'image', 'post_image')
+
+
+@receiver(pre_save, sender=Post)
+def post_remember_group(sender, instance, **kwargs):
+    instance._old_group = (None, None)
+    if instance.pk:
+        instance._old_group = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'group__slug').first() or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def post_bump_generations(sender, instance, created, **kwargs):
+    scopes = generations.post_scopes(
+        instance, [] if created else _tag_slugs(instance)
+    )
+    old_group_id, old_group_slug = instance._old_group
+    if old_group_slug:
+        scopes.append(generations.group_scope(old_group_slug))
+    generations.bump(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def post_group_counters(sender, instance, created, **kwargs):
+    old_group_id, _ = instance._old_group
+    if old_group_id == instance.group_id:
+        return
+    if old_group_id:
+        counters.change_group(old_group_id, 'posts_count', -1)
+    if instance.group_id:
+        counters.change_group(instance.group_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_group_decrement(sender, instance, **kwargs):
+    if instance.group_id:
+        counters.change_group(instance.group_id, 'posts_count', -1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_remember_tags(sender, instance, **kwargs):
+    instance._tag_slugs = _tag_slugs(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_delete_bump_generations(sender, instance, **kwargs):
+    generations.bump(
+        *generations.post_scopes(instance, instance._tag_slugs)
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_index_search(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindex_search(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def follow_fill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.add_author_to_feed(instance.user_id, instance.author_id)
+        _bump_author(instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_trim_feed(sender, instance, **kwargs):
+    feed.remove_author_from_feed(instance.user_id, instance.author_id)
+    _bump_author(instance.author_id)
+
+
+def _bump_author(author_id):
+    # Кнопка подписки на странице автора зависит от подписок зрителя.
+    username = User.objects.filter(pk=author_id).values_list(
+        'username', flat=True
+    ).first()
+    if username:
+        generations.bump(generations.author_scope(username))
+
+
+@receiver(post_save, sender=Profile)
+def profile_bump_generations(sender, instance, created, **kwargs):
+    # Имя и фото автора есть на его странице и на страницах его постов.
+    # Сохранение User сохраняет и профиль (users.models), так что смена
+    # имени тоже попадает сюда.
+    if not created:
+        generations.bump(generations.author_scope(instance.user.username))
+
+
+@receiver(post_save, sender=Like)
+def like_increment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.post_id, 'likes_count', 1)
+        counters.schedule_reconcile(post_id=instance.post_id)
+
+
+@receiver(post_delete, sender=Like)
+def like_decrement(sender, instance, **kwargs):
+    counters.change(instance.post_id, 'likes_count', -1)
+    counters.schedule_reconcile(post_id=instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_increment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.post_id, 'comments_count', 1)
+        counters.change_author(instance.author_id, 'comments_count', 1)
+        counters.schedule_reconcile(instance.post_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_decrement(sender, instance, **kwargs):
+    counters.change(instance.post_id, 'comments_count', -1)
+    counters.change_author(instance.author_id, 'comments_count', -1)
+    counters.schedule_reconcile(instance.post_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def user_create_stats(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_author_increment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_author(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_author_decrement(sender, instance, **kwargs):
+    counters.change_author(instance.author_id, 'posts_count', -1)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def tags_touch_post(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        return
+    if action == 'pre_clear':
+        instance._cleared_tag_slugs = _tag_slugs(instance)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    Post.objects.filter(pk=instance.pk).update(updated=timezone.now())
+    if action == 'post_clear':
+        slugs = instance._cleared_tag_slugs
+    else:
+        slugs = Tag.objects.filter(pk__in=pk_set).values_list(
+            'slug', flat=True
+        )
+    generations.bump(*generations.post_scopes(instance, slugs))
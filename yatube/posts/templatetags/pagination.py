@@ -0,0 +1,17 @@
+from django import template
+
+register = template.Library()
+
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, **params):
+    """Ссылка на другую страницу ленты с сохранением прочих GET-параметров
+    (поискового запроса, сортировки)."""
+    query = context['request'].GET.copy()
+    for key in PAGE_PARAMS:
+        query.pop(key, None)
+    for key, value in params.items():
+        query[key] = value
+    return f'?{query.urlencode()}'
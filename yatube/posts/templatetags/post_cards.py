@@ -0,0 +1,76 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+@register.filter
+def tag_color(tag):
+    """Постоянный цвет кнопки тега: один и тот же тег всегда одного цвета."""
+    colors = settings.TAGS_COLORS
+    return colors[tag.pk % len(colors)]
+
+
+def card_version(post):
+    """Токен версии карточки.
+
+    Меняется при редактировании поста и его тегов (поле updated),
+    лайках и комментариях (денормализованные счетчики), а также при
+    смене имени или фото автора, названия группы и переименовании
+    тегов. Теги берутся из prefetch_related, который делает for_cards.
+    """
+    author = post.author
+    profile = getattr(author, 'profile', None)
+    parts = (
+        ','.join(f'{tag.slug}:{tag.name}' for tag in post.tags.all()),
+        post.updated.isoformat(),
+        post.likes_count,
+        post.comments_count,
+        author.username,
+        author.first_name,
+        author.last_name,
+        profile.photo.name if profile else '',
+        post.group.slug if post.group else '',
+        post.group.title if post.group else '',
+    )
+    raw = '|'.join(str(part) for part in parts).encode()
+    return hashlib.md5(raw).hexdigest()
+
+
+def card_cache_key(post, group_link):
+    return f'post_card:{post.pk}:{int(group_link)}:{card_version(post)}'
+
+
+@register.simple_tag
+def post_cards(posts, group_link=False):
+    """Отрисовывает карточки постов, доставая готовые из кэша одним
+    get_many и дорисовывая только отсутствующие.
+
+    Карточка с оригиналом картинки вместо еще не нарезанных версий в
+    кэш не попадает: версия карточки не меняется, когда нарезка
+    закончится, и оригинал остался бы в лентах на сутки.
+    """
+    keys = {card_cache_key(post, group_link): post for post in posts}
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in keys.items():
+        if key in cards:
+            continue
+        pending = []
+        cards[key] = render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'group_link': group_link,
+            'renditions_pending': pending,
+        })
+        if not pending:
+            missing[key] = cards[key]
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(''.join(cards[key] for key in keys))
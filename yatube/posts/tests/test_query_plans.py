@@ -0,0 +1,102 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Like, Post, User
+from posts.utils import encode_cursor
+
+FULL_SCAN_RE = re.compile(r'^SCAN (TABLE )?\S+( AS \S+)?$')
+TEMP_SORT_RE = re.compile(r'TEMP B-TREE FOR .*(ORDER|GROUP) BY')
+
+# Посты тега сортируются после соединения с taggit_taggeditem: в таблице
+# тегов нет даты поста, и индекс под такую сортировку построить нельзя.
+# Сортируется только выборка одного тега.
+ALLOWED = {
+    'posts:index_by_tag': (TEMP_SORT_RE,),
+}
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class QueryPlanTests(TestCase):
+    """Планы запросов страниц-списков и поста не деградируют."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='group',
+            description='Описание',
+        )
+        for number in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                group=cls.group,
+                text=f'Пост {number}',
+            )
+            cls.post.tags.add('tag')
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Да')
+        Like.objects.create(post=cls.post, user=cls.reader)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def pages(self):
+        cursor = encode_cursor(Post.objects.order_by('pub_date', 'id')[5])
+        follow = reverse('posts:follow_index')
+        detail = reverse('posts:post_detail', args=(self.post.pk,))
+        return [
+            ('posts:index', self.guest, reverse('posts:index')),
+            ('posts:index_by_tag', self.guest,
+             reverse('posts:index_by_tag', args=('tag',))),
+            ('posts:group_list', self.guest,
+             reverse('posts:group_list', args=(self.group.slug,))),
+            ('posts:profile', self.guest,
+             reverse('posts:profile', args=(self.author.username,))),
+            ('posts:groups', self.guest, reverse('posts:groups')),
+            ('posts:authors_list', self.guest, reverse('posts:authors_list')),
+            ('posts:post_detail', self.guest, detail),
+            ('posts:post_detail', self.reader_client, detail),
+            ('posts:follow_index', self.reader_client, follow),
+            ('posts:follow_index', self.reader_client,
+             f'{follow}?after={cursor}'),
+            ('posts:follow_index', self.reader_client,
+             f'{follow}?before={cursor}'),
+        ]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_listings_use_indexes(self):
+        """Списки и пост читаются по индексам без полных сканов
+        и сортировок во временном B-дереве."""
+        for name, client, url in self.pages():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            allowed = ALLOWED.get(name, ())
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                for step in self.explain(query['sql']):
+                    if any(pattern.search(step) for pattern in allowed):
+                        continue
+                    with self.subTest(url=url, step=step):
+                        self.assertIsNone(
+                            FULL_SCAN_RE.match(step), query['sql']
+                        )
+                        self.assertIsNone(
+                            TEMP_SORT_RE.search(step), query['sql']
+                        )
@@ -1,15 +1,33 @@
+from io import StringIO
 from math import ceil
 from time import sleep
+from unittest import mock
+import base64
+import re
 import shutil
 import tempfile
 
 from django import forms
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.http import HttpResponse
+from django.template import Context as TemplateContext, Template
+from django.test import (Client, RequestFactory, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from posts.models import Follow, Group, Post, User
+from taggit.models import Tag
+
+from core import jobs
+from core.routers import use_primary
+from core.testing import QueryBudgetMixin
+from posts import generations
+from posts.models import (AuthorStats, Comment, FeedItem, Follow, Group,
+                          Like, Post, User)
 
 POSTS_SAMPLE = 104
 POSTS_PER_PAGE = 10
@@ -175,20 +193,80 @@ class PostsViewsTests(TestCase):
         self.assertNotContains(response, "Добавить комментарий:")
 
     def test_index_page_cache(self):
-        """Проверка хранения и очищения кэша главной страницы"""
+        """Проверка хранения и инвалидации кэша главной страницы"""
         response_1 = self.guest_client.get(reverse('posts:index'))
-        Post.objects.create(
-            author=self.user1,
-            text='Новый пост'
-        )
+        Post.objects.filter(pk=self.post1.pk).update(text='Без сигналов')
         response_2 = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(
             response_1.content,
             response_2.content,
             'Кэширование на главной не работает')
-        cache.clear()
+        Post.objects.create(
+            author=self.user1,
+            text='Новый пост'
+        )
         response_3 = self.guest_client.get(reverse('posts:index'))
-        self.assertNotEqual(response_2.content, response_3.content)
+        self.assertNotEqual(
+            response_2.content,
+            response_3.content,
+            'Новый пост не сбрасывает кэш главной страницы'
+        )
+
+    def test_listing_cache_is_not_shared_between_users(self):
+        """Страница вошедшего пользователя не попадает в кэш страниц"""
+        other_client = Client()
+        other_client.force_login(self.user2)
+        menu = f'Пользователь: {self.user1.username}'
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.user2.username, )),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.authorized_client.get(url), menu)
+                self.assertNotContains(other_client.get(url), menu)
+                self.assertNotContains(self.guest_client.get(url), menu)
+
+    def test_listing_generations_are_scoped(self):
+        """Запись поста сбрасывает кэш только затронутых лент"""
+        group_url = reverse('posts:group_list', args=(self.group.slug, ))
+        profile_url = reverse('posts:profile', args=(self.user1.username, ))
+        group_response = self.guest_client.get(group_url)
+        self.guest_client.get(profile_url)
+        post = Post.objects.create(author=self.user1, text='Новый пост')
+        self.assertEqual(
+            self.guest_client.get(group_url).content,
+            group_response.content,
+            'Пост вне группы сбросил кэш страницы группы'
+        )
+        self.assertContains(self.guest_client.get(profile_url), post.text)
+        post.group = self.group
+        post.save()
+        self.assertContains(self.guest_client.get(group_url), post.text)
+        tag_url = reverse('posts:index_by_tag', args=('fresh', ))
+        post.tags.add('fresh')
+        self.assertContains(self.guest_client.get(tag_url), post.text)
+        post.delete()
+        self.assertNotContains(self.guest_client.get(group_url), post.text)
+        self.assertEqual(self.guest_client.get(tag_url).status_code, 200)
+        self.assertNotContains(self.guest_client.get(tag_url), post.text)
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_listing_reads_primary_after_bump(self):
+        """Сразу после смены поколения лента читается с основной базы"""
+        reads = []
+
+        @generations.cache_listing('group', 'slug')
+        def view(request, slug):
+            reads.append(use_primary.get())
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        view(request, slug='quiet')
+        generations.bump(generations.group_scope('fresh'))
+        view(request, slug='fresh')
+        self.assertEqual(reads, [False, True])
+        self.assertFalse(use_primary.get())
 
 
 class PaginatorViewsTests(TestCase):
@@ -206,6 +284,7 @@ class PaginatorViewsTests(TestCase):
 
     def setUp(self):
         self.guest_client = Client()
+        cache.clear()
 
     def test_paginator(self):
         """ Работа пагинатора на 1 и последней странице"""
@@ -230,6 +309,45 @@ class PaginatorViewsTests(TestCase):
                         f'страница №{page_number}'
                     )
 
+    def test_keyset_paginator(self):
+        """Курсорная пагинация ленты подписок проходит все посты"""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.user)
+        client = Client()
+        client.force_login(follower)
+        url = reverse('posts:follow_index')
+        response = client.get(url)
+        seen = []
+        while True:
+            page_obj = response.context['page_obj']
+            seen.extend(post.id for post in page_obj)
+            if not page_obj.has_next:
+                break
+            previous_page = [post.id for post in page_obj]
+            response = client.get(url, {'after': page_obj.next_token})
+            back = client.get(
+                url, {'before': response.context['page_obj'].previous_token}
+            )
+            self.assertEqual(
+                [post.id for post in back.context['page_obj']],
+                previous_page,
+                'Переход на предыдущую страницу по курсору работает неверно'
+            )
+        self.assertEqual(len(seen), POSTS_SAMPLE)
+        self.assertEqual(len(set(seen)), POSTS_SAMPLE)
+
+    def test_keyset_paginator_rejects_bad_cursor(self):
+        """Испорченный курсор не роняет ленту подписок"""
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:follow_index')
+        for raw in ('2024-01-01T00:00:00|99999999999999999999',
+                    'not-a-cursor'):
+            token = base64.urlsafe_b64encode(raw.encode()).decode()
+            with self.subTest(raw=raw):
+                response = client.get(url, {'after': token})
+                self.assertIn(response.status_code, (200, 404))
+
 
 class PostCreateViewsTests(TestCase):
     @classmethod
@@ -287,6 +405,7 @@ class FollowerViewsTests(TestCase):
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(FollowerViewsTests.user1)
+        cache.clear()
 
     def test_subscription_for_authorized(self):
         """Авторизованный пользователь создает и удаляет подписки"""
@@ -355,3 +474,636 @@ class FollowerViewsTests(TestCase):
             Follow.objects.filter(user=self.user1, author=self.user1).exists(),
             'Пользователь подписался сам на себя'
         )
+
+    def test_feed_follows_subscription_changes(self):
+        """Лента подписок заполняется при подписке и чистится при отписке"""
+        post = Post.objects.create(author=self.user2, text='старый пост')
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.user2, ))
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(
+            post,
+            response.context['page_obj'],
+            'Старые посты автора не попали в ленту нового подписчика'
+        )
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=(self.user2, ))
+        )
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertNotIn(
+            post,
+            response.context['page_obj'],
+            'Посты автора остались в ленте после отписки'
+        )
+
+    @override_settings(FEED_INLINE_FOLLOWERS=0)
+    def test_large_fan_out_runs_in_background(self):
+        """Пост автора с множеством подписчиков раскладывается задачей"""
+        Follow.objects.create(user=self.user1, author=self.user2)
+        post = Post.objects.create(author=self.user2, text='test')
+        feed = FeedItem.objects.filter(user=self.user1, post=post)
+        self.assertFalse(feed.exists())
+        jobs.run_pending()
+        self.assertTrue(feed.exists())
+
+    def test_backfill_feeds_command(self):
+        """Команда backfill_feeds восстанавливает ленты по подпискам"""
+        Follow.objects.create(user=self.user1, author=self.user2)
+        post = Post.objects.create(author=self.user2, text='test')
+        FeedItem.objects.all().delete()
+        call_command('backfill_feeds', stdout=StringIO())
+        self.assertTrue(
+            FeedItem.objects.filter(user=self.user1, post=post).exists(),
+            'Команда backfill_feeds не заполнила ленту'
+        )
+
+
+class PostCountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='test')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PostCountersTests.reader)
+
+    def assertCounters(self, likes, comments):
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, likes)
+        self.assertEqual(self.post.comments_count, comments)
+
+    def test_counters_follow_likes_and_comments(self):
+        """Счетчики лайков и комментариев меняются вместе с данными"""
+        self.authorized_client.get(
+            reverse('posts:post_like', args=(self.post.id, ))
+        )
+        self.authorized_client.post(
+            reverse('posts:add_comment', args=(self.post.id, )),
+            data={'text': 'Комментарий'}
+        )
+        self.assertCounters(1, 1)
+        comment = Comment.objects.get(post=self.post)
+        self.authorized_client.get(
+            reverse('posts:del_comment', args=(comment.id, ))
+        )
+        self.authorized_client.get(
+            reverse('posts:post_unlike', args=(self.post.id, ))
+        )
+        self.assertCounters(0, 0)
+
+    def test_counters_follow_cascade_delete(self):
+        """Каскадное удаление пользователя уменьшает счетчики"""
+        user = User.objects.create_user(username='temporary')
+        Like.objects.create(user=user, post=self.post)
+        Comment.objects.create(author=user, post=self.post, text='test')
+        self.assertCounters(1, 1)
+        user.delete()
+        self.assertCounters(0, 0)
+
+    def test_post_save_keeps_counters(self):
+        """Правка поста не затирает счетчики, выросшие после загрузки"""
+        stale = Post.objects.get(pk=self.post.pk)
+        Like.objects.create(user=self.reader, post=self.post)
+        Comment.objects.create(author=self.reader, post=self.post, text='Да')
+        stale.text = 'Правка'
+        stale.save()
+        self.assertCounters(1, 1)
+        self.assertEqual(self.post.text, 'Правка')
+        self.assertIsNotNone(self.post.last_activity)
+
+    def test_post_save_after_delete(self):
+        """Сохранение удаленного поста не создает его заново"""
+        stale = Post.objects.get(pk=self.post.pk)
+        Post.objects.filter(pk=self.post.pk).delete()
+        stale.text = 'Правка'
+        with self.assertRaises(Post.DoesNotExist):
+            stale.save()
+        self.assertFalse(Post.objects.filter(pk=stale.pk).exists())
+
+    def test_recount_command_repairs_drift(self):
+        """Команда recount_post_counters исправляет рассинхронизацию"""
+        Like.objects.create(user=self.reader, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(
+            likes_count=10, comments_count=5
+        )
+        call_command('recount_post_counters', stdout=StringIO())
+        self.assertCounters(1, 0)
+
+    @override_settings(COUNTERS_RECONCILE_DELAY=0)
+    def test_reconcile_job_repairs_drift(self):
+        """Фоновая сверка пересчитывает счетчики поста после лайка"""
+        Like.objects.create(user=self.reader, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=10)
+        jobs.run_pending()
+        self.assertCounters(1, 0)
+
+
+class SeedCommandTests(TestCase):
+    def test_seed_builds_consistent_data(self):
+        """Команда seed создает данные с верными счетчиками и лентами"""
+        call_command(
+            'seed', users=30, groups=3, posts=200, tags=10, follows=5,
+            seed=1, stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertFalse(
+            User.objects.filter(profile__isnull=True).exists()
+        )
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'day').count(), 1
+        )
+        post = Post.objects.order_by('-likes_count').first()
+        self.assertEqual(post.likes_count, post.liked.count())
+        self.assertEqual(
+            post.comments_count, Comment.objects.filter(post=post).count()
+        )
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertTrue(FeedItem.objects.filter(
+            user=follow.user, author=follow.author
+        ).exists())
+
+    def test_seed_bumps_listing_generations(self):
+        """seed сбрасывает кэш общей ленты, групп, тегов и авторов"""
+        with mock.patch.object(generations, 'bump') as bump:
+            call_command(
+                'seed', users=5, groups=2, posts=20, tags=2, follows=0,
+                seed=1, stdout=StringIO()
+            )
+        scopes = set(bump.call_args.args)
+        expected = {generations.ALL_POSTS}
+        expected.update(
+            generations.group_scope(group.slug)
+            for group in Group.objects.all()
+        )
+        expected.update(
+            generations.author_scope(post.author.username)
+            for post in Post.objects.select_related('author')
+        )
+        self.assertLessEqual(expected, scopes)
+
+
+class CardQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        cls.follower = User.objects.create_user(username='follower')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(CardQueriesTests.follower)
+
+    def create_post(self, number):
+        author = User.objects.create_user(username=f'author{number}')
+        Follow.objects.get_or_create(user=self.follower, author=author)
+        post = Post.objects.create(
+            author=author, text=f'Пост {number}', group=self.group
+        )
+        post.tags.add(f'tag{number}', 'common')
+        return post
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_listing_queries_do_not_depend_on_page_size(self):
+        """Число запросов в лентах не зависит от числа карточек"""
+        first = self.create_post(0)
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index_by_tag', args=('common', )),
+            reverse('posts:group_list', args=(self.group.slug, )),
+            reverse('posts:profile', args=(first.author.username, )),
+            reverse('posts:follow_index'),
+            reverse('posts:search_results') + '?q=Пост',
+        )
+        single = {url: self.count_queries(url) for url in urls}
+        for number in range(1, POSTS_PER_PAGE):
+            post = self.create_post(number)
+            post.author = first.author
+            post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.count_queries(url),
+                    single[url],
+                    f'N+1 запросов при отрисовке карточек на {url}'
+                )
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='test')
+        cls.template = Template('{% load post_cards %}{% post_cards posts %}')
+
+    def setUp(self):
+        cache.clear()
+
+    def render_cards(self):
+        return self.template.render(
+            TemplateContext({'posts': Post.objects.for_cards()})
+        )
+
+    def test_cached_cards_are_not_rendered_again(self):
+        """Карточка из кэша не отрисовывается повторно"""
+        self.render_cards()
+        with self.assertTemplateNotUsed('posts/includes/post_card.html'):
+            self.render_cards()
+
+    def test_card_version_changes_with_post(self):
+        """Лайки, теги и правка поста обновляют закэшированную карточку"""
+        self.render_cards()
+        Like.objects.create(user=self.reader, post=self.post)
+        with self.assertTemplateUsed('posts/includes/post_card.html'):
+            self.render_cards()
+        self.post.tags.add('new_tag')
+        self.assertIn('new_tag', self.render_cards())
+        Tag.objects.filter(name='new_tag').update(name='renamed_tag')
+        self.assertIn('renamed_tag', self.render_cards())
+        self.post.refresh_from_db()
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.assertIn('Исправленный текст', self.render_cards())
+
+
+class SearchViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            author=cls.user, text='Смешные котики играют с клубком'
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user, text='Собаки и котик: собаки дружат с котом'
+        )
+        cls.other = Post.objects.create(
+            author=cls.user, text='Рецепт пирога'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query):
+        response = self.guest_client.get(
+            reverse('posts:search_results'), {'q': query}
+        )
+        return list(response.context['page_obj'])
+
+    def test_search_uses_russian_stemming(self):
+        """Поиск находит посты по другим формам слова"""
+        self.assertCountEqual(self.search('котиков'), [self.cats, self.dogs])
+        self.assertEqual(self.search('пироги'), [self.other])
+
+    def test_search_ranks_by_relevance(self):
+        """Более релевантный пост выше в выдаче"""
+        self.assertEqual(self.search('собака')[0], self.dogs)
+
+    def test_search_without_query(self):
+        """Поиск без запроса не падает и ничего не находит"""
+        response = self.guest_client.get(reverse('posts:search_results'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_search_index_follows_posts(self):
+        """Индекс обновляется при правке и удалении поста"""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Рецепт торта'
+        post.save()
+        self.assertEqual(self.search('пирог'), [])
+        self.assertEqual(self.search('торт'), [post])
+        post.delete()
+        self.assertEqual(self.search('торт'), [])
+
+    def test_rebuild_search_index_command(self):
+        """Команда rebuild_search_index восстанавливает индекс"""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_search')
+        self.assertEqual(self.search('пирог'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('пирог'), [self.other])
+
+
+class AuthorsListViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.writer = User.objects.create_user(username='writer')
+        cls.talker = User.objects.create_user(username='talker')
+        cls.admin = User.objects.create_user(username='admin')
+        cls.post = Post.objects.create(author=cls.writer, text='1')
+        Post.objects.create(author=cls.writer, text='2')
+        Post.objects.create(author=cls.admin, text='3')
+        Post.objects.create(author=cls.admin, text='4')
+        Post.objects.create(author=cls.admin, text='5')
+        for _ in range(2):
+            Comment.objects.create(
+                author=cls.talker, post=cls.post, text='комментарий'
+            )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_author_stats_follow_posts_and_comments(self):
+        """Статистика авторов обновляется при создании и удалении"""
+        stats = AuthorStats.objects.get(user=self.writer)
+        self.assertEqual(
+            (stats.posts_count, stats.comments_count), (2, 0)
+        )
+        Comment.objects.filter(author=self.talker).first().delete()
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.talker).comments_count, 1
+        )
+        Post.objects.filter(author=self.writer).first().delete()
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.writer).posts_count, 1
+        )
+
+    def test_authors_list_reads_precomputed_stats(self):
+        """Страница авторов строится по готовой статистике"""
+        response = self.guest_client.get(reverse('posts:authors_list'))
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj[0].user, self.writer)
+        self.assertNotIn(
+            self.admin, [stats.user for stats in page_obj],
+            'Служебные пользователи попали в рейтинг авторов'
+        )
+        self.assertEqual(response.context['posts_king'].user, self.writer)
+        self.assertEqual(response.context['comments_king'].user, self.talker)
+
+    def test_recount_command_repairs_author_stats(self):
+        """Команда recount_post_counters пересчитывает статистику"""
+        AuthorStats.objects.filter(user=self.writer).delete()
+        AuthorStats.objects.filter(user=self.talker).update(comments_count=9)
+        call_command('recount_post_counters', stdout=StringIO())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.writer).posts_count, 2
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.talker).comments_count, 2
+        )
+
+
+class GroupsViewsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.quiet = Group.objects.create(
+            title='А тихая группа', slug='quiet', description=''
+        )
+        cls.busy = Group.objects.create(
+            title='Я активная группа', slug='busy', description=''
+        )
+        for _ in range(3):
+            Post.objects.create(author=cls.user, text='test', group=cls.busy)
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_group_posts_count_follows_posts(self):
+        """Число постов группы меняется при создании, переносе и удалении"""
+        post = Post.objects.filter(group=self.busy).first()
+        post.group = self.quiet
+        post.save()
+        self.assertEqual(Group.objects.get(pk=self.busy.pk).posts_count, 2)
+        self.assertEqual(Group.objects.get(pk=self.quiet.pk).posts_count, 1)
+        post.delete()
+        self.assertEqual(Group.objects.get(pk=self.quiet.pk).posts_count, 0)
+
+    def test_groups_sorting(self):
+        """Сообщества сортируются по активности и по названию"""
+        response = self.guest_client.get(reverse('posts:groups'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.busy, self.quiet])
+        response = self.guest_client.get(
+            reverse('posts:groups'), {'sort': 'title'}
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.quiet, self.busy])
+
+    def test_groups_queries_do_not_depend_on_groups_count(self):
+        """Число запросов в каталоге групп не зависит от числа групп"""
+        url = reverse('posts:groups')
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url)
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'group{i}', description='')
+            for i in range(settings.GROUPS_ON_PAGE)
+        )
+        with self.assertNumQueries(len(queries)):
+            response = self.guest_client.get(url, {'page': 2})
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+
+class ToggleApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='test')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ToggleApiTests.reader)
+        self.like_url = reverse('posts:api_post_like', args=(self.post.id,))
+        self.follow_url = reverse(
+            'posts:api_profile_follow', args=(self.author.username,)
+        )
+
+    def test_like_toggle_is_idempotent(self):
+        """Повторный лайк не создает дубль, ответ - состояние и счетчик"""
+        for _ in range(2):
+            response = self.authorized_client.post(self.like_url)
+            self.assertEqual(response.json(), {'active': True, 'count': 1})
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        for _ in range(2):
+            response = self.authorized_client.delete(self.like_url)
+            self.assertEqual(response.json(), {'active': False, 'count': 0})
+        self.assertFalse(Like.objects.exists())
+
+    def test_follow_toggle_is_idempotent(self):
+        """Подписка через API идемпотентна и возвращает число подписчиков"""
+        for _ in range(2):
+            response = self.authorized_client.post(self.follow_url)
+            self.assertEqual(response.json(), {'active': True, 'count': 1})
+        response = self.authorized_client.delete(self.follow_url)
+        self.assertEqual(response.json(), {'active': False, 'count': 0})
+        self.assertFalse(Follow.objects.exists())
+
+    def test_profile_follow_button_is_per_viewer(self):
+        """Кнопка подписки и ее CSRF-токен принадлежат зрителю страницы"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user(username='other')
+        profile_url = reverse('posts:profile', args=(self.author.username,))
+        for user, following in ((self.reader, True), (other, False)):
+            with self.subTest(user=user.username):
+                client = Client(enforce_csrf_checks=True)
+                client.force_login(user)
+                response = client.get(profile_url)
+                self.assertEqual(response.context['following'], following)
+                csrf = re.search(
+                    r'data-csrf="([^"]+)"', response.content.decode()
+                ).group(1)
+                method = client.delete if following else client.post
+                response = method(self.follow_url, HTTP_X_CSRFTOKEN=csrf)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['active'], not following)
+
+    def test_toggle_errors(self):
+        """Гость, свой пост и GET-запрос получают ошибку"""
+        self.assertEqual(Client().post(self.like_url).status_code, 401)
+        self.assertEqual(self.authorized_client.get(self.like_url).status_code,
+                         405)
+        own_client = Client()
+        own_client.force_login(self.author)
+        self.assertEqual(own_client.post(self.like_url).status_code, 403)
+        self.assertEqual(own_client.post(self.follow_url).status_code, 403)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = Post.objects.create(
+            author=cls.author, text='test', group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_listings_answer_not_modified(self):
+        """Ленты отвечают 304 по ETag без запросов к базе"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        etags = [self.assertRevalidates(url) for url in urls]
+        Post.objects.create(author=self.author, text='new', group=self.group)
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_answers_not_modified(self):
+        """Страница поста отвечает 304, пока нет новых лайков и правок"""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Like.objects.create(user=self.reader, post=self.post)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_detail_etag_follows_viewer_and_author(self):
+        """ETag поста меняется при входе зрителя и правке профиля автора"""
+        url = reverse('posts:post_detail', args=(self.post.id,))
+        guest_etag = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        reader_etag = self.client.get(url)['ETag']
+        self.assertNotEqual(reader_etag, guest_etag)
+        self.author.first_name = 'Лев'
+        self.author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=reader_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Лев')
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for number in range(3):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}'
+            )
+            cls.post.tags.add('tag', f'tag{number}')
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий'
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text='Ответ'
+            )
+        Like.objects.create(post=cls.post, user=cls.reader)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_views_fit_query_budget(self):
+        """Страницы укладываются в бюджет запросов и не делают N+1"""
+        post_id = self.post.pk
+        # Сессия и пользователь добавляют авторизованному клиенту
+        # два запроса.
+        budgets = (
+            (self.guest_client, reverse('posts:index'), 3),
+            (self.guest_client,
+             reverse('posts:index_by_tag', args=('tag',)), 4),
+            (self.guest_client, reverse('posts:search_results') + '?q=Пост',
+             4),
+            (self.guest_client,
+             reverse('posts:group_list', args=(self.group.slug,)), 4),
+            (self.guest_client,
+             reverse('posts:profile', args=(self.author.username,)), 5),
+            (self.reader_client,
+             reverse('posts:profile', args=(self.author.username,)), 8),
+            (self.guest_client, reverse('posts:groups'), 2),
+            (self.guest_client, reverse('posts:authors_list'), 4),
+            (self.guest_client,
+             reverse('posts:post_detail', args=(post_id,)), 4),
+            (self.reader_client,
+             reverse('posts:post_detail', args=(post_id,)), 7),
+            (self.reader_client, reverse('posts:follow_index'), 4),
+            (self.author_client, reverse('posts:post_create'), 3),
+            (self.author_client,
+             reverse('posts:post_edit', args=(post_id,)), 5),
+            (self.reader_client,
+             reverse('posts:post_edit', args=(post_id,)), 3),
+        )
+        for client, url, budget in budgets:
+            with self.subTest(url=url):
+                cache.clear()
+                with self.assertQueryBudget(budget):
+                    client.get(url)
@@ -36,6 +36,16 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        'api/posts/<int:post_id>/like/',
+        views.api_post_like,
+        name='api_post_like'
+    ),
+    path(
+        'api/profile/<str:username>/follow/',
+        views.api_profile_follow,
+        name='api_profile_follow'
+    ),
     path('search/', views.search, name='search_results'),
     path('tag/<tag_slug>', views.index, name='index_by_tag'),
     path('', views.index, name='index'),
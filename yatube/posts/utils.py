@@ -1,8 +1,110 @@
+import base64
+import binascii
+
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class KeysetPage:
+    """Страница курсорной пагинации по паре (pub_date, id).
+
+    В отличие от Paginator не выполняет COUNT(*) и OFFSET: соседние
+    страницы адресуются непрозрачными токенами ?after= / ?before=.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_token(self):
+        if self.has_next:
+            return encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_token(self):
+        if self.has_previous:
+            return encode_cursor(self.object_list[0])
+
+
+# Диапазон BigAutoField: id вне его ломает SQL-параметр (OverflowError).
+MIN_ID, MAX_ID = -2 ** 63, 2 ** 63 - 1
+
 
+def encode_cursor(post):
+    raw = f'{post.pub_date.isoformat()}|{post.id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
 
-def get_posts_context(queryset, request):
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        pub_date, post_id = raw.decode().split('|')
+        pub_date = parse_datetime(pub_date)
+        post_id = int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None or not MIN_ID <= post_id <= MAX_ID:
+        return None
+    return pub_date, post_id
+
+
+def get_keyset_page(queryset, request, per_page, scope=Q(),
+                    keys=('pub_date', 'id')):
+    """Страница по курсору.
+
+    keys - поля сортировки со значениями pub_date и id поста: для ленты
+    подписок это поля FeedItem, чтобы срез читался прямо из индекса
+    ленты. scope накладывается тем же filter(), что и курсор, - иначе
+    условия на многозначную связь дали бы второй JOIN.
+    """
+    date_key, id_key = keys
+    after = decode_cursor(request.GET.get('after', ''))
+    before = decode_cursor(request.GET.get('before', ''))
+    if before:
+        pub_date, post_id = before
+        rows = list(queryset.filter(
+            scope,
+            Q(**{f'{date_key}__gt': pub_date})
+            | Q(**{date_key: pub_date, f'{id_key}__gt': post_id})
+        ).order_by(date_key, id_key)[:per_page + 1])
+        has_previous = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], True, has_previous)
+    if after:
+        pub_date, post_id = after
+        scope &= (
+            Q(**{f'{date_key}__lt': pub_date})
+            | Q(**{date_key: pub_date, f'{id_key}__lt': post_id})
+        )
+    rows = list(queryset.filter(scope).order_by(
+        f'-{date_key}', f'-{id_key}'
+    )[:per_page + 1])
+    return KeysetPage(rows[:per_page], len(rows) > per_page, bool(after))
+
+
+def get_posts_context(queryset, request, keyset=False, **keyset_options):
+    if keyset:
+        return {
+            'page_obj': get_keyset_page(
+                queryset, request, settings.POSTS_ON_PAGE, **keyset_options
+            ),
+        }
     paginator = Paginator(queryset, settings.POSTS_ON_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -18,3 +120,12 @@ def get_authors_context(queryset, request):
     return {
         'page_obj': page_obj,
     }
+
+
+def get_groups_context(queryset, request):
+    paginator = Paginator(queryset, settings.GROUPS_ON_PAGE)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    return {
+        'page_obj': page_obj,
+    }
@@ -1,70 +1,81 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_http_methods
 
 from taggit.models import Tag
 
-from .utils import get_posts_context, get_authors_context
+from .conditional import post_condition
+from .generations import cache_listing
+from .search import search_posts
+from .utils import get_authors_context, get_groups_context, get_posts_context
 from .forms import CommentForm, PostForm
-from .models import Comment, Group, Follow, Like, Post, User
+from .models import AuthorStats, Comment, Group, Follow, Like, Post, User
 
+GROUPS_ORDERING = {
+    'activity': ('-posts_count', 'title'),
+    'title': ('title',),
+}
 
-@cache_page(settings.INDEX_CACHE_TIMEOUT, key_prefix="index_page")
+
+@cache_listing('tag', 'tag_slug')
 def index(request, tag_slug=None):
-    posts = Post.objects.select_related('group', 'author')
+    posts = Post.objects.for_cards()
     tag = None
     if tag_slug:
         tag = get_object_or_404(Tag, slug=tag_slug)
         posts = posts.filter(tags__in=[tag])
     context = get_posts_context(posts, request)
     context['tag'] = tag
-    context['tags_colors'] = settings.TAGS_COLORS
     return render(request, 'posts/index.html', context)
 
 
 def search(request):
-    search = request.GET.get('q')
-    context = get_posts_context(
-        Post.objects.select_related('group', 'author').filter(
-            text__icontains=search
-        ),
-        request
-    )
-    context['tags_colors'] = settings.TAGS_COLORS
+    query = request.GET.get('q', '')
+    context = get_posts_context(search_posts(query), request)
     return render(request, 'posts/index.html', context)
 
 
 @login_required
 def follow_index(request):
     context = get_posts_context(
-        Post.objects.filter(
-            author__following__user=request.user
-        ).select_related('group'),
-        request
+        Post.objects.for_cards(),
+        request,
+        keyset=True,
+        scope=Q(feed_items__user=request.user),
+        keys=('feed_items__pub_date', 'feed_items__post_id'),
     )
-    context['tags_colors'] = settings.TAGS_COLORS
     return render(request, 'posts/follow.html', context)
 
 
 def groups(request):
-    groups = Group.objects.all()
-    return render(request, 'posts/groups_all.html', {"page_obj": groups})
+    sort = request.GET.get('sort')
+    if sort not in GROUPS_ORDERING:
+        sort = 'activity'
+    context = get_groups_context(
+        Group.objects.order_by(*GROUPS_ORDERING[sort]), request
+    )
+    context['sort'] = sort
+    return render(request, 'posts/groups_all.html', context)
 
 
 def authors_list(request):
-    authors = User.objects.annotate(posts_qty=Count('posts')).order_by(
-        '-posts_qty'
-    ).exclude(username__in=('admin', 'superadmin'))
+    stats = AuthorStats.objects.select_related('user')
+    authors = stats.exclude(
+        user__username__in=settings.AUTHORS_EXCLUDED
+    ).order_by('-posts_count', 'user')
     context = get_authors_context(authors, request)
-    context['posts_king'] = authors[0]
-    context['comments_king'] = User.objects.annotate(
-        comments_qty=Count('comments')).order_by('-comments_qty')[0]
-    context['tags_colors'] = settings.TAGS_COLORS
+    context['posts_king'] = authors.first()
+    context['comments_king'] = stats.order_by(
+        '-comments_count', 'user'
+    ).first()
     return render(request, 'posts/authors_list.html', context)
 
 
+@cache_listing('group', 'slug')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {
@@ -72,35 +83,35 @@ def group_posts(request, slug):
     }
     context.update(
         get_posts_context(
-            group.posts.select_related('author'),
+            group.posts.for_cards(),
             request
         )
     )
-    context['tags_colors'] = settings.TAGS_COLORS
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_listing('author', 'username')
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     context = {
         'author': author,
     }
     context.update(
-        get_posts_context(author.posts.select_related('group'), request)
+        get_posts_context(author.posts.for_cards(), request)
     )
     if request.user.is_authenticated:
         context['following'] = request.user.follower.filter(
             author=author).exists()
-    context['tags_colors'] = settings.TAGS_COLORS
     return render(request, 'posts/profile.html', context)
 
 
+@post_condition
 def post_detail(request, post_id):
     post = get_object_or_404(
-        Post.objects.select_related('group', 'author'),
+        Post.objects.for_cards().select_related('author__stats'),
         id=post_id
     )
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     form = CommentForm()
     liked = (request.user.is_authenticated
              and request.user.liker.filter(post=post).exists())
@@ -109,7 +120,6 @@ def post_detail(request, post_id):
         'comments': comments,
         'form': form,
         'liked': liked,
-        'tags_colors': settings.TAGS_COLORS,
     }
     return render(request, 'posts/post_detail.html', context)
 
@@ -133,18 +143,17 @@ def post_create(request):
 @login_required
 def post_delete(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    author = post.author
-    if author != request.user:
+    if post.author_id != request.user.id:
         return redirect('posts:post_detail', post_id)
     else:
         post.delete()
-        return redirect('posts:profile', author.username)
+        return redirect('posts:profile', request.user.username)
 
 
 @login_required
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.id:
         return redirect('posts:post_detail', post_id)
 
     form = PostForm(
@@ -154,7 +163,10 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         post = form.save(commit=False)
-        post.save()
+        try:
+            post.save()
+        except Post.DoesNotExist:
+            raise Http404('Пост удален')
         form.save_m2m()
         return redirect('posts:post_detail', post_id)
 
@@ -165,15 +177,32 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+def _create_once(model, **fields):
+    """INSERT, который упирается в unique_together вместо проверки exists().
+
+    Возвращает число созданных записей: 0, если запись уже была.
+    """
+    try:
+        with transaction.atomic():
+            model.objects.create(**fields)
+    except IntegrityError:
+        return 0
+    return 1
+
+
+def _toggle_response(active, count):
+    return JsonResponse({'active': active, 'count': count})
+
+
+def _login_required_response():
+    return JsonResponse({'error': 'Нужно войти на сайт'}, status=401)
+
+
 @login_required
 def post_like(request, post_id):
     post = get_object_or_404(Post, id=post_id)
-    if (post.author != request.user
-            and not request.user.liker.filter(post=post).exists()):
-        Like.objects.create(
-            user=request.user,
-            post=post
-        )
+    if post.author_id != request.user.id:
+        _create_once(Like, user=request.user, post=post)
     return redirect('posts:post_detail', post_id)
 
 
@@ -201,23 +230,18 @@ def add_comment(request, post_id):
 @login_required
 def del_comment(request, comment_id):
     comment = get_object_or_404(Comment, id=comment_id)
-    author = comment.author
-    if author != request.user:
-        return redirect('posts:post_detail', comment.post.id)
+    if comment.author_id != request.user.id:
+        return redirect('posts:post_detail', comment.post_id)
     else:
         comment.delete()
-    return redirect('posts:post_detail', comment.post.id)
+    return redirect('posts:post_detail', comment.post_id)
 
 
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if (author != request.user
-            and not request.user.follower.filter(author=author).exists()):
-        Follow.objects.create(
-            user=request.user,
-            author=author
-        )
+    if author != request.user:
+        _create_once(Follow, user=request.user, author=author)
     return redirect('posts:profile', username)
 
 
@@ -228,3 +252,52 @@ def profile_unfollow(request, username):
         user=request.user
     ).delete()
     return redirect('posts:profile', username)
+
+
+@require_http_methods(['POST', 'DELETE'])
+def api_post_like(request, post_id):
+    """POST ставит лайк, DELETE снимает; повторный запрос ничего не меняет.
+
+    Отвечает JSON с новым состоянием и числом лайков поста.
+    """
+    if not request.user.is_authenticated:
+        return _login_required_response()
+    author_id, likes_count = get_object_or_404(
+        Post.objects.values_list('author_id', 'likes_count'), pk=post_id
+    )
+    if author_id == request.user.pk:
+        return JsonResponse(
+            {'error': 'Нельзя лайкать свои посты'}, status=403
+        )
+    if request.method == 'POST':
+        likes_count += _create_once(Like, user=request.user, post_id=post_id)
+        return _toggle_response(True, likes_count)
+    deleted, _ = Like.objects.filter(
+        user=request.user, post_id=post_id
+    ).delete()
+    return _toggle_response(False, likes_count - deleted)
+
+
+@require_http_methods(['POST', 'DELETE'])
+def api_profile_follow(request, username):
+    """POST подписывает на автора, DELETE отписывает.
+
+    Отвечает JSON с новым состоянием и числом подписчиков автора.
+    """
+    if not request.user.is_authenticated:
+        return _login_required_response()
+    author_id = get_object_or_404(
+        User.objects.values_list('pk', flat=True), username=username
+    )
+    if author_id == request.user.pk:
+        return JsonResponse(
+            {'error': 'Нельзя подписаться на себя'}, status=403
+        )
+    if request.method == 'POST':
+        _create_once(Follow, user=request.user, author_id=author_id)
+    else:
+        Follow.objects.filter(user=request.user, author_id=author_id).delete()
+    return _toggle_response(
+        request.method == 'POST',
+        Follow.objects.filter(author_id=author_id).count(),
+    )
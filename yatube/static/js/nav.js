@@ -0,0 +1,62 @@
+// Выпадающие меню и вкладки Bootstrap (data-bs-toggle="dropdown" и
+// data-bs-toggle="pill") без подключения bootstrap.bundle.js.
+(function () {
+  'use strict';
+
+  function closeDropdowns(except) {
+    document.querySelectorAll('.dropdown-menu.show').forEach(function (menu) {
+      if (menu !== except) {
+        menu.classList.remove('show');
+        var toggle = menu.parentElement.querySelector(
+          '[data-bs-toggle="dropdown"]'
+        );
+        if (toggle) {
+          toggle.setAttribute('aria-expanded', 'false');
+        }
+      }
+    });
+  }
+
+  function toggleDropdown(toggle) {
+    var menu = toggle.parentElement.querySelector('.dropdown-menu');
+    if (!menu) {
+      return;
+    }
+    closeDropdowns(menu);
+    var shown = menu.classList.toggle('show');
+    toggle.setAttribute('aria-expanded', String(shown));
+  }
+
+  function showPill(button) {
+    var list = button.closest('[role="tablist"]');
+    var target = document.querySelector(button.dataset.bsTarget);
+    if (!list || !target) {
+      return;
+    }
+    list.querySelectorAll('[data-bs-toggle="pill"]').forEach(function (item) {
+      var active = item === button;
+      item.classList.toggle('active', active);
+      item.setAttribute('aria-selected', String(active));
+    });
+    target.parentElement.querySelectorAll('.tab-pane').forEach(function (pane) {
+      var active = pane === target;
+      pane.classList.toggle('active', active);
+      pane.classList.toggle('show', active);
+    });
+  }
+
+  document.addEventListener('click', function (event) {
+    var toggle = event.target.closest('[data-bs-toggle]');
+    if (!toggle) {
+      closeDropdowns(null);
+      return;
+    }
+    if (toggle.dataset.bsToggle === 'dropdown') {
+      event.preventDefault();
+      toggleDropdown(toggle);
+    } else if (toggle.dataset.bsToggle === 'pill') {
+      event.preventDefault();
+      showPill(toggle);
+    }
+  });
+})();
@@ -0,0 +1,56 @@
+// Лайки и подписки без перехода на другую страницу.
+//
+// Кнопка с data-toggle-url отправляет POST, чтобы включить состояние,
+// и DELETE, чтобы выключить, и обновляет себя по ответу
+// {"active": ..., "count": ...}. Без JS работает обычная ссылка href.
+(function () {
+  'use strict';
+
+  function render(button, state) {
+    button.dataset.active = String(state.active);
+    button.querySelectorAll('[data-when]').forEach(function (element) {
+      var when = state.active ? 'active' : 'inactive';
+      element.classList.toggle('d-none', element.dataset.when !== when);
+    });
+    button.querySelectorAll('[data-active-fill]').forEach(function (element) {
+      element.setAttribute(
+        'fill', state.active ? element.dataset.activeFill : 'none'
+      );
+    });
+    if (button.dataset.activeClass) {
+      button.classList.toggle(button.dataset.activeClass, state.active);
+      button.classList.toggle(button.dataset.inactiveClass, !state.active);
+    }
+    button.querySelectorAll('[data-toggle-count]').forEach(function (element) {
+      element.textContent = state.count;
+    });
+  }
+
+  document.addEventListener('click', function (event) {
+    var button = event.target.closest('[data-toggle-url]');
+    if (!button || button.classList.contains('disabled')) {
+      return;
+    }
+    event.preventDefault();
+    if (button.dataset.busy) {
+      return;
+    }
+    button.dataset.busy = 'true';
+    fetch(button.dataset.toggleUrl, {
+      method: button.dataset.active === 'true' ? 'DELETE' : 'POST',
+      headers: {'X-CSRFToken': button.dataset.csrf},
+      credentials: 'same-origin'
+    }).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.json();
+    }).then(function (state) {
+      render(button, state);
+    }).catch(function () {
+      window.location.href = button.href;
+    }).finally(function () {
+      delete button.dataset.busy;
+    });
+  });
+})();
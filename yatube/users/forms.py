@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 
+from core.uploads import BoundedImageField
+
 from .models import Profile, User
 
 
@@ -20,3 +22,4 @@ class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
         fields = ('bio', 'location', 'birth_date', 'photo')
+        field_classes = {'photo': BoundedImageField}
@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from core import media
+
 
 User = get_user_model()
 
@@ -47,3 +49,6 @@ class Profile(models.Model):
     @receiver(post_save, sender=User)
     def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
+
+
+media.track(Profile, 'photo', 'profile_photo')
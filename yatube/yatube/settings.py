@@ -36,29 +36,46 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'sorl.thumbnail',
     'taggit',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.SQLiteWriteRetryMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
+TEST_RUNNER = 'core.testing.DiscoverRunner'
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    ('core.template_loaders.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -78,11 +95,51 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60 * 10,
+        'OPTIONS': {
+            'timeout': 20,
+        },
     }
 }
 
+# Read replicas: add aliases to DATABASES (with 'TEST': {'MIRROR':
+# 'default'}) and list them here, e.g. a second SQLite file kept in sync
+# by litestream or a Postgres standby.
+DATABASE_REPLICAS = []
+DATABASE_REPLICA_BALANCING = 'random'  # or 'round_robin'
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+READ_YOUR_WRITES_SECONDS = 10
+
+# SQL queries per view: more than QUERY_BUDGETS[view_name] queries, or the
+# same SELECT shape more than QUERY_REPEAT_LIMIT times, is logged by
+# core.middleware.QueryBudgetMiddleware. Tests check repeats strictly
+# through core.testing.QueryBudgetMixin.
+QUERY_BUDGETS = {}
+QUERY_REPEAT_LIMIT = 5
+
+# Prometheus metrics at /metrics, merged across worker processes through
+# per-process files in METRICS_DIR (see core.metrics). The endpoint is
+# open to staff users and to scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" (bearer_token in Prometheus).
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(BASE_DIR, 'metrics')
+)
+METRICS_FLUSH_INTERVAL = 1
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20 * 1000,
+    'mmap_size': 256 * 2 ** 20,
+    'cache_size': -64 * 2 ** 10,
+    'temp_store': 'memory',
+}
+SQLITE_WRITE_RETRIES = 3
+SQLITE_RETRY_DELAY = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -122,17 +179,37 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_MAX_SIZE = 10 * 2 ** 20
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_DIMENSION = 2560
 
 
 # CONSTANTS
 
+AUTHORS_EXCLUDED = ('admin', 'superadmin')
 AUTHORS_ON_PAGE = 20
-INDEX_CACHE_TIMEOUT = 5
+COUNTERS_RECONCILE_DELAY = 60
+FEED_BACKFILL_SIZE = 500
+FEED_BATCH_SIZE = 500
+FEED_INLINE_FOLLOWERS = 1000
+GROUPS_ON_PAGE = 20
+LISTING_CACHE_TIMEOUT = 60 * 5
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
 POST_STRING_TITLE = 15
 POSTS_ON_PAGE = 10
+SEARCH_RECENCY_DAYS = 30
 TAGS_COLORS = ['primary', 'secondary', 'success', 'danger', 'warning', 'info', 'light', 'dark']
 
 # OTHER SETTINGS
@@ -145,8 +222,39 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+JOB_BATCH_SIZE = 100
+JOB_LOCK_TIMEOUT = 60 * 10
+JOB_MAX_ATTEMPTS = 5
+JOB_POLL_INTERVAL = 1
+JOB_RETRY_DELAY = 30
+JOB_WORKERS = 4
+
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_PRESETS = {
+    'post_image': {
+        'card': {'size': (960, 339), 'crop': True, 'widths': (320, 640, 960)},
+        'detail': {'size': (960, 339), 'crop': False, 'widths': (480, 960)},
+    },
+    'profile_photo': {
+        'avatar': {
+            'size': (200, 200),
+            'crop': True,
+            'widths': (60, 100, 120, 200, 400),
+        },
+    },
+}
+
+# Listing generations (posts.generations) and cached pages must be shared
+# by all worker processes, otherwise a bump in one worker is invisible to
+# the others. LocMemCache is per process and only fits a single worker;
+# set MEMCACHED_LOCATION (e.g. 127.0.0.1:11211) to run several.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.LocMemCache',
     }
 }
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES['default'] = {
+        'BACKEND': 'core.cache.PyMemcacheCache',
+        'LOCATION': os.environ['MEMCACHED_LOCATION'],
+    }